@@ -69,11 +69,11 @@ def square(center,xw,yw):
             [center[0]-xw/2,center[1]+yw/2]]
     return square
 
-from shapely.geometry import Point
-from shapely.geometry.polygon import Polygon
-
 #checks to see if a point with x-y coordinates is in the area a
+# (shapely is imported when first used, so models only pay the cost of importing it if they need it)
 def inrange(area, x, y):
+    from shapely.geometry import Point
+    from shapely.geometry.polygon import Polygon
     point=Point(x,y)
     polygon=Polygon(area)
     return polygon.contains(point)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+File name: benchmark.py
+Description: A headless benchmark of the propagation code, for judging changes to its performance
+
+Each model is timed for:
+    - runnominal, simulating the nominal run (without the nominal cache)
+    - proponefault, running one fault scenario (with the nominal run cached)
+    - propagate, propagating one time-step of the nominal model (the mean over the time range)
+    - proplist, running every single-fault scenario of the model
+    - propbatch, running every single-fault scenario of the model in a batch (see faultprop.propbatch)
+The models are the pump (ex_pump), the drone (quad_mdl), and synthetic models (see synth_mdl)
+of increasing size. Each time is the best of a number of repeats.
+
+The time to import each module of the simulation core (in a new interpreter) is also timed,
+and checked against an import-time budget. Plotting and table modules (matplotlib, astropy, 
+shapely) are only imported when first used, so importing the core must not import them.
+
+Usage:
+    python benchmark.py --out results.json
+    python benchmark.py --baseline results.json --tolerance 0.2
+    python benchmark.py --models --sizes 10 100 1000 --loops 0.2 --plot scaling.png
+With a baseline, each time is compared with the time in the baseline, and the benchmark
+fails (with exit status 1) if any is slower than the baseline by more than the tolerance.
+It also fails if importing the core is over budget (see --importbudget).
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import faultprop as fp
+import synth_mdl
+
+#models to benchmark by default, and the sizes of the synthetic models
+models=['ex_pump', 'quad_mdl']
+synthsizes=[10, 30, 100]
+#modules of the simulation core to time the import of, the time in seconds importing each
+#may take, and the modules which should only be imported when used
+coremodules=['faultprop', 'ex_pump', 'quad_mdl', 'synth_mdl']
+importbudget=0.5
+heavymodules=['matplotlib', 'astropy', 'shapely']
+
+#besttime
+# times a function, giving the best time of a number of repeats
+# inputs: fxn, the function to time (with no arguments), repeat, the number of repeats, and
+#         setup, a function to call before each repeat (not timed), if given
+# outputs: the best time in seconds
+def besttime(fxn, repeat=3, setup=None):
+    times=[]
+    for i in range(repeat):
+        if setup:
+            setup()
+        start=time.perf_counter()
+        fxn()
+        times.append(time.perf_counter()-start)
+    return min(times)
+
+#timestep
+# times propagating the time-steps of the nominal model, giving the mean time per time-step
+def timestep(mdl):
+    g=fp.initgraph(mdl)
+    nomscen=fp.constructnomscen(g)
+    timerange=range(mdl.times[0], mdl.times[-1]+1)
+    start=time.perf_counter()
+    for rtime in timerange:
+        fp.propagate(g, nomscen['faults'], rtime)
+    return (time.perf_counter()-start)/len(timerange)
+
+#timeimport
+# times importing a module in a new interpreter (so modules already imported are not counted)
+# inputs: module, the name of the module, and repeat, the number of repeats
+# outputs: importtime, the best time in seconds, and heavy, the heavy modules imported with it
+def timeimport(module, repeat=3):
+    code='import sys, time; start=time.perf_counter(); import '+module+'; print(time.perf_counter()-start); '+ \
+         'print(",".join([name for name in '+repr(heavymodules)+' if name in sys.modules]))'
+    times=[]
+    for i in range(repeat):
+        output=subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True, universal_newlines=True, \
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split('\n')
+        times.append(float(output[0]))
+        heavy=[name for name in output[1].split(',') if name]
+    return min(times), heavy
+
+#checkimports
+# checks the import times of the simulation core (see runbenchmarks) against a budget
+# inputs: benchmarks, the results (see runbenchmarks), and budget, the time importing a module may take
+# outputs: overbudget, a list of descriptions of the modules over budget or importing heavy modules
+def checkimports(benchmarks, budget=importbudget):
+    overbudget=[]
+    for module, importtime in benchmarks['results']['import'].items():
+        heavy=benchmarks['meta']['heavyimports'][module]
+        if importtime>budget:
+            overbudget.append(module+' takes %.3g s to import (budget %.3g s)' % (importtime, budget))
+        if heavy:
+            overbudget.append(module+' imports '+', '.join(heavy))
+    for problem in overbudget:
+        print('IMPORT BUDGET: '+problem)
+    return overbudget
+
+#benchmodel
+# runs the benchmarks of a model
+# inputs: mdl, the model module, and repeat, the number of repeats of each benchmark
+# outputs: results, a dictionary of the time of each benchmark {benchmark:time}
+def benchmodel(mdl, repeat=3):
+    g=fp.initgraph(mdl)
+    scen=fp.listinitfaults(g, mdl.times[1:2])[0]
+    fxnname, mode=scen['properties']['function'], scen['properties']['fault']
+    results={}
+    results['runnominal']=besttime(lambda: fp.runnominal(mdl), repeat, fp.clearnomcache)
+    results['proponefault']=besttime(lambda: fp.proponefault(mdl, fxnname, mode, mdl.times[1]), repeat, lambda: fp.nominaltraj(mdl))
+    results['propagate']=min([timestep(mdl) for i in range(repeat)])
+    #the table module is imported the first time a list of results is made, which should not be timed
+    fp.proplist(mdl, times=mdl.times[1:2])
+    results['proplist']=besttime(lambda: fp.proplist(mdl), repeat, fp.clearnomcache)
+    results['propbatch']=besttime(lambda: fp.proplist(mdl, batch=True), repeat, fp.clearnomcache)
+    return results
+
+#runbenchmarks
+# runs the benchmarks of each model
+# inputs: mdlnames, the names of the model modules, sizes, the numbers of functions of the
+#         synthetic models, repeat, the number of repeats of each benchmark, and synthargs,
+#         the other arguments of the synthetic models (see synth_mdl.makemodel)
+# outputs: benchmarks, a dictionary with the results of each model and information on the
+#          machine they were run on {meta:{...}, results:{model:{benchmark:time}}}, where 
+#          meta includes the spec of each synthetic model (see synth_mdl.makemodel)
+def runbenchmarks(mdlnames=models, sizes=synthsizes, repeat=3, synthargs={}):
+    results={'import':{}}
+    heavyimports={}
+    for module in coremodules:
+        results['import'][module], heavyimports[module]=timeimport(module, repeat)
+    print('%-15s ' % 'import' + ' '.join(['%s: %.3g s' % (module, value) for module, value in results['import'].items()]))
+    mdls={name:importlib.import_module(name) for name in mdlnames}
+    for size in sizes:
+        mdls['synth_'+str(size)]=synth_mdl.makemodel(size, **synthargs)
+    for name, mdl in mdls.items():
+        results[name]=benchmodel(mdl, repeat)
+        print('%-15s ' % name + ' '.join(['%s: %.3g s' % (bench, value) for bench, value in results[name].items()]))
+    meta={'python':platform.python_version(), 'numpy':np.__version__, 'machine':platform.machine(), \
+          'platform':platform.platform(), 'date':time.strftime('%Y-%m-%d %H:%M:%S'), 'repeat':repeat, \
+          'specs':{name:mdl.spec for name, mdl in mdls.items() if hasattr(mdl, 'spec')}, 'heavyimports':heavyimports}
+    return {'meta':meta, 'results':results}
+
+#comparebenchmarks
+# compares benchmark results with a baseline, finding regressions
+# inputs: benchmarks, the results (see runbenchmarks), baseline, the results to compare with,
+#         and tolerance, the fraction slower than the baseline a time can be before it is a regression
+# outputs: regressions, a list of (model, benchmark, baseline time, time) of the regressions
+def comparebenchmarks(benchmarks, baseline, tolerance=0.2):
+    regressions=[]
+    for name, results in benchmarks['results'].items():
+        for bench, value in results.items():
+            basevalue=baseline['results'].get(name, {}).get(bench)
+            if basevalue is None:
+                continue
+            change=(value-basevalue)/basevalue
+            flag='REGRESSION' if change>tolerance else ''
+            print('%-15s %-13s %10.3g s %10.3g s %+8.1f%% %s' % (name, bench, basevalue, value, 100*change, flag))
+            if change>tolerance:
+                regressions.append((name, bench, basevalue, value))
+    return regressions
+
+#plotscaling
+# plots the time of each benchmark of the synthetic models against their number of functions
+# inputs: benchmarks, the results (see runbenchmarks), and filename, the file to save the plot to
+def plotscaling(benchmarks, filename):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    specs=benchmarks['meta']['specs']
+    names=sorted(specs, key=lambda name: specs[name]['numfxns'])
+    if not names:
+        return
+    fig, axes=plt.subplots(1, len(benchmarks['results'][names[0]]), figsize=(16, 4))
+    for ax, bench in zip(axes, benchmarks['results'][names[0]]):
+        ax.loglog([specs[name]['numfxns'] for name in names], [benchmarks['results'][name][bench] for name in names], 'o-')
+        ax.set_title(bench)
+        ax.set_xlabel('Functions')
+        ax.set_ylabel('Time (s)')
+    fig.tight_layout()
+    fig.savefig(filename)
+    plt.close(fig)
+
+if __name__=='__main__':
+    parser=argparse.ArgumentParser(description='Benchmark the propagation of fault models')
+    parser.add_argument('--models', nargs='*', default=models, help='model modules to benchmark')
+    parser.add_argument('--sizes', nargs='*', type=int, default=synthsizes, help='numbers of functions of the synthetic models')
+    parser.add_argument('--flows', type=int, default=1, help='flows per edge of the synthetic models')
+    parser.add_argument('--modes', type=int, default=2, help='fault modes per function of the synthetic models')
+    parser.add_argument('--loops', type=float, default=0.0, help='feedback loop density of the synthetic models')
+    parser.add_argument('--horizon', type=int, default=55, help='last time of the synthetic models')
+    parser.add_argument('--repeat', type=int, default=3, help='repeats of each benchmark (the best is kept)')
+    parser.add_argument('--out', default='', help='file to write the results to (as JSON)')
+    parser.add_argument('--baseline', default='', help='results to compare with (as JSON)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='fraction slower than the baseline flagged as a regression')
+    parser.add_argument('--importbudget', type=float, default=importbudget, help='time in seconds importing each module of the simulation core may take')
+    parser.add_argument('--plot', default='', help='file to save a plot of the times of the synthetic models against their size to')
+    args=parser.parse_args()
+
+    synthargs={'flowsperedge':args.flows, 'modesperfxn':args.modes, 'loopdensity':args.loops, 'horizon':args.horizon}
+    benchmarks=runbenchmarks(args.models, args.sizes, args.repeat, synthargs)
+    if args.out:
+        with open(args.out, 'w') as file:
+            json.dump(benchmarks, file, indent=1)
+    if args.plot:
+        plotscaling(benchmarks, args.plot)
+    failed=bool(checkimports(benchmarks, args.importbudget))
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline=json.load(file)
+        regressions=comparebenchmarks(benchmarks, baseline, args.tolerance)
+        if regressions:
+            print(str(len(regressions))+' regressions found')
+            failed=True
+    if failed:
+        sys.exit(1)
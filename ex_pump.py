@@ -35,40 +35,48 @@ times=[0,3, 55]
 # Flows are defined using Python classes that are instantiated as objects
 
 # Below defines the class for Electrical Energy
-class EE:
+# Flows can be based on the Flow class in faultprop, which keeps track of when the
+# states of the flow change so that the model can be propagated faster
+class EE(fp.Flow):
+    #the states of the flow are declared in __slots__ (which keeps the flow compact) 
+    # and statevars (which tells faultprop which attributes to watch and display)
+    __slots__=('rate', 'effort')
+    statevars=('rate', 'effort')
     #attributes of the flow are defined during initialization
     def __init__(self):
+        #the Flow class must be initialized before any states are set
+        super().__init__()
         #arbitrary states for the flows can be defined. 
         #in this case, rate is the analogue to flow (e.g. current)
         #while effort is the analogue to force (e.g. voltage)
         self.rate=1.0
         self.effort=1.0
     #each flow has a status function that relays the values of important states when queried
-    def status(self):
-        #each state must be returned in this dictionary to be able to see it in the results
-        status={'rate':self.rate, 'effort':self.effort}
-        return status.copy()
+    # the Flow class provides one returning {statevar: value} for each of the statevars,
+    # so it does not need to be defined here
     
 # Defining the class for the flow of Water
-class Water:
+class Water(fp.Flow):
+    __slots__=('rate', 'effort', 'visc', 'level')
+    statevars=('rate', 'effort', 'visc', 'level')
+    #statenames gives the names of the states in status() if they differ from the attributes
+    statenames=('rate', 'effort', 'viscosity', 'level')
     def __init__(self):
+        super().__init__()
         self.rate=1.0 # (e.g. vol flow rate m^3/s)
         self.effort=1.0 # (e.g. pressure)
         #here we will define a different state, viscosity, to illustrate conditional faults
         self.visc=1.0 
         #level is the water level--if there is no water, nothing can flow
         self.level=1.0
-    def status(self):
-        status={'rate':self.rate, 'effort':self.effort, 'viscosity': self.visc, 'level': self.level}
-        return status.copy()
 # Defining the class for the flow of Signal
-class Signal:
+class Signal(fp.Flow):
+    __slots__=('power',)
+    statevars=('power',)
     def __init__(self):
+        super().__init__()
         #here we define signal as just an on/off state
         self.power=1.0
-    def status(self):
-        status={'power':self.power}
-        return status.copy()
 
 
 ##DEFINE MODEL FUNCTIONS
@@ -177,6 +185,16 @@ class importSig:
         self.faults.update(faults)  
         self.behavior(time)
         return 
+    #batchupdatefxn is an optional vectorized form of updatefxn used when scenarios are
+    # run together in a batch (see fp.propbatch). Here self stands for the function in all of 
+    # the scenarios, so flow states are arrays with a value for each scenario
+    def batchupdatefxn(self, time=0):
+        if time<5 or time>=50:
+            power=0.0
+        else:
+            power=1.0
+        #hasfault gives whether the fault is present in each scenario
+        self.Sigout.power=np.where(self.hasfault('no_sig'), 0.0, power)
 
 # Move Water is the pump itself. While one could decompose this further,
 # one function is used for simplicity
@@ -226,6 +244,26 @@ class moveWat:
         self.condfaults(time)           #conditional faults and behavior are then run
         self.behavior(time)
         return 
+    #the batch form of updatefxn has the same conditions as condfaults and behavior,
+    # but uses np.where to choose between the values for each scenario
+    def batchupdatefxn(self, time=0):
+        highpressure=self.Watout.effort>5.0
+        reset=highpressure & (self.t1>time)
+        self.t1=np.where(reset, time, self.t1)
+        self.timer=self.timer+reset
+        #addfault adds the fault in the scenarios where the condition is true
+        self.addfault('mech_break', highpressure & (self.timer>10.0))
+        
+        short=self.hasfault('short')
+        self.EEin.rate=np.where(short, 500, 1.0)*self.Sigin.power*self.EEin.effort
+        effstate=np.where(short, 0.0, 1.0)
+        self.effstate=effstate
+        
+        self.Watout.effort=self.Sigin.power*effstate*self.Watin.level*self.Watout.visc
+        self.Watout.rate=self.Sigin.power*effstate*self.Watin.level/self.Watout.visc
+        
+        self.Watin.effort=self.Watout.effort
+        self.Watin.rate=self.Watout.rate
     
 #INSTANTIATE MODEL
 #the model is initialized using an initialize function
@@ -285,11 +323,14 @@ def findclassification(resgraph, endfaults, endflows, scen):
     
     life=100
     
+    ratekey={'rare': 1e-7, 'moderate': 1e-5}
     if scen['properties']['type']=='nominal':
         rate=1.0
+    elif scen['properties']['type']=='multi-fault':
+        #in multi-fault scenarios, each fault has a rate, so the joint rate is their product
+        rate=np.prod([ratekey[qualrate] for qualrate in scen['properties']['rate']])
     else:
         qualrate=scen['properties']['rate']
-        ratekey={'rare': 1e-7, 'moderate': 1e-5}
         rate=ratekey[qualrate]
     
     life=1e5
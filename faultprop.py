@@ -7,10 +7,20 @@ Forked from the IBFM toolkit, original author Matthew McIntire
 
 Description: functions to propagate faults through a user-defined fault model
 """
+import csv
+import heapq
+import importlib
+import itertools
+import json
+import os
+import pickle
+import types
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
 import networkx as nx
 import numpy as np
-import matplotlib.pyplot as plt
-from astropy.table import Table, Column
+#matplotlib and astropy are only imported by the functions which plot results or make tables
+#of them (when first called), so runs that do neither (e.g. in worker processes) do not import them
 
 
 ##PLOTTING AND RESULTS DISPLAY
@@ -23,10 +33,11 @@ from astropy.table import Table, Column
 #           - nominal/nominal keeps the history ifor both faulty and nominal flows
 #           - flow is all flows that were tracked 
 #           - attribute is the defined attributes of that flow (e.g. rate/effort/etc)
-#           - values is a list of values that attribute takes over time
+#           - values is an array (or list) of values that attribute takes over time
 #   - fault, name of the fault that was injected (for the titles)
 #   - time, the time in which the fault was initiated (so that time is displayed on the graph)
 def plotflowhist(flowhist, fault='', time=0):
+    import matplotlib.pyplot as plt
     for flow in flowhist['faulty']:
         fig = plt.figure()
         plots=len(flowhist['faulty'][flow])
@@ -45,6 +56,25 @@ def plotflowhist(flowhist, fault='', time=0):
         fig.suptitle('Dynamic Response of '+flow+' to fault'+' '+fault)
         plt.show()
 
+#plotsensitivity
+# displays plots of how the results of each fault mode change with the time it is injected
+# inputs:
+#   - curves, the sensitivity curves of fault modes from propsweep (see findsensitivity)
+#   - metric, the result to plot (e.g. 'expected cost', 'cost', or 'degraded flows')
+#   - function, the function to plot the modes of (all functions if not given)
+def plotsensitivity(curves, metric='expected cost', function=''):
+    import matplotlib.pyplot as plt
+    fig = plt.figure()
+    for (fxnname, mode), curve in curves.items():
+        if function and fxnname!=function:
+            continue
+        plt.plot(curve['times'], curve[metric], label=fxnname+': '+mode)
+    plt.xlabel('injection time')
+    plt.ylabel(metric)
+    plt.legend()
+    fig.suptitle('Sensitivity of '+metric+' to fault injection time')
+    plt.show()
+
 #plotghist
 # displays plots of the graph over time
 # inputs:
@@ -65,6 +95,7 @@ def plotghist(ghist,faultscen=[]):
 #   - faultscen, the name of the fault scenario (for the title)
 #   - time, the time of the fault scenario (also for the title)
 def showgraph(g, faultscen=[], time=[]):
+    import matplotlib.pyplot as plt
     labels=dict()
     for edge in g.edges:
         flows=list(g.get_edge_data(edge[0],edge[1]).keys())
@@ -99,6 +130,7 @@ def showgraph(g, faultscen=[], time=[]):
 #   - time: the time the fault occured in
 #   - endresult: the results dict given by the model after propagation
 def printresult(function, mode, time, endresult):
+    from astropy.table import Table
     
     #FUNCTION  | MODE  | TIME  | EFFECTS  |  RATE  |  COST  |  EXP COST
     vals=  [[function],[mode],[time],\
@@ -126,16 +158,17 @@ def constructnomscen(g):
 # runs the model over time in the nominal scenario
 # inputs:
 #   - mdl, the python model module set up in mdl.py
-#   - track, the flows to track (a list of strings)
+#   - track, the flows to track (a list of strings, or 'all')
 #   - gtrack, the times to snapshot the graph
 # outputs:
 #   - endresults, a dictionary summary of results at the end of the simulation with structure
-#    {flows:{flow:attribute:value},faults:{function:{faults}}, classification:{rate:val, cost:val, expected cost: val} }
+#    {flows:{flow:attribute:value},faults:{function:{faults}}, classification:{rate:val, cost:val, expected cost: val},
+#     warnings:[warning]} where warnings are the warnings from propagation (see propagate)
 #   - resgraph, a graph object with function faults and degraded flows noted
 #   - flowhist, a dictionary with the history of the flow over time
 #   - graphhist, a dictionary of results graph objects over time with structure {time:graph}
 def runnominal(mdl, track={}, gtrack={}):
-    graph=mdl.initialize()
+    graph=initgraph(mdl)
     nomscen=constructnomscen(graph)
     scen=nomscen.copy()
     endresults, resgraph, flowhist, graphhist =runonefault(mdl, scen, track, gtrack)
@@ -149,16 +182,17 @@ def runnominal(mdl, track={}, gtrack={}):
 #   - fxnname, the function the fault is initiated in
 #   - faultmode, the mode to initiate
 #   - time, the time when the mode is to be initiated
-#   - track, the flows to track (a list of strings)
+#   - track, the flows to track (a list of strings, or 'all')
 #   - gtrack, the times to snapshot the graph
 # outputs:
 #   - endresults, a dictionary summary of results at the end of the simulation with structure
-#    {flows:{flow:attribute:value},faults:{function:{faults}}, classification:{rate:val, cost:val, expected cost: val} }
+#    {flows:{flow:attribute:value},faults:{function:{faults}}, classification:{rate:val, cost:val, expected cost: val},
+#     warnings:[warning]} where warnings are the warnings from propagation (see propagate)
 #   - resgraph, a graph object with function faults and degraded flows noted
 #   - flowhist, a dictionary with the history of the flow over time
 #   - graphhist, a dictionary of results graph objects over time with structure {time:graph}
 def proponefault(mdl, fxnname, faultmode, time=0, track={}, gtrack={}):
-    graph=mdl.initialize()
+    graph=initgraph(mdl)
     nomscen=constructnomscen(graph)
     scen=nomscen.copy()
     scen['faults'][fxnname]=faultmode
@@ -198,15 +232,92 @@ def listinitfaults(g, times=[0]):
         print('Incomplete Function Definition, function: '+fxnname)
     return faultlist
 
+#listmultifaults
+# creates a list of multi-fault scenarios, combining the single-fault scenarios of the 
+# graph (see listinitfaults) in different functions. A multi-fault scenario is defined as:
+#   {faults:{functions:faultmodes}, properties:{type:'multi-fault', function:functions, 
+#    fault:modes, rate:rates, time:first time, faulttimes:{function:time}, singles:[keys]}}
+#   where function, fault, and rate are the lists of the functions, modes and rates of the 
+#   faults, faulttimes are the times each fault is injected at, and singles are the keys
+#   (function, mode, time) of the single-fault scenarios that were combined
+# inputs:
+#   - g, the model graph
+#   - times, a vector of times for the faults to occur
+#   - numfaults, the number of faults in each scenario (e.g. 2 or 3)
+#   - simultaneous, whether the faults are only combined with faults at the same time 
+#     (if False, faults at each of the different times are combined)
+# outputs: a list of multi-fault scenarios
+def listmultifaults(g, times=[0], numfaults=2, simultaneous=True):
+    singles=[(scen['properties']['function'], scen['properties']['fault'], scen['properties']['time']) for scen in listinitfaults(g, times)]
+    faultlist=[]
+    for combo in itertools.combinations(singles, numfaults):
+        if len(set([fxnname for fxnname, mode, time in combo]))<numfaults:
+            continue
+        if simultaneous and len(set([time for fxnname, mode, time in combo]))>1:
+            continue
+        faultlist.append(constructfaultscen(g, combo))
+    return faultlist
+
+#constructfaultscen
+# creates the scenario of a given set of faults: a single-fault scenario (as in listinitfaults)
+# if given one fault, or a multi-fault scenario (see listmultifaults) if given more
+# inputs: g, the model graph, and singles, a list of keys (function, mode, time) of the faults
+# outputs: newscen, the fault scenario
+def constructfaultscen(g, singles):
+    newscen=constructnomscen(g)
+    for fxnname, mode, time in singles:
+        newscen['faults'][fxnname]=mode
+    rates=[getfaultprops(fxnname, mode, g, prop='rate') for fxnname, mode, time in singles]
+    if len(singles)==1:
+        fxnname, mode, time = singles[0]
+        newscen['properties']={'type': 'single-fault', 'function': fxnname, 'fault': mode, 'rate': rates[0], 'time': time}
+    else:
+        newscen['properties']={'type':'multi-fault', 'function':[fxnname for fxnname, mode, time in singles], 
+                               'fault':[mode for fxnname, mode, time in singles], 'rate':rates, 
+                               'time':min([time for fxnname, mode, time in singles]),
+                               'faulttimes':{fxnname:time for fxnname, mode, time in singles}, 'singles':list(singles)}
+    return newscen
+
+#getinjections
+# gets the faults to inject at each time in a scenario. Faults are injected at the time of
+# the scenario, unless given other times in its faulttimes (see listmultifaults)
+# inputs: scen, the fault scenario
+# outputs: injections, a dictionary of the faults injected at each time {time:{function:mode}}
+def getinjections(scen):
+    faulttimes=scen['properties'].get('faulttimes', {})
+    injections={}
+    for fxnname, mode in scen['faults'].items():
+        if mode!='nom':
+            time=faulttimes.get(fxnname, scen['properties']['time'])
+            injections.setdefault(time, {})[fxnname]=mode
+    return injections
+
 #proplist
 # creates and propagates a list of failure scenarios in a model
 # input: mdl, the module where the model was set up
+#        workers, the number of processes to run the scenarios in (1 runs them in this process)
+#        batch, whether to run the scenarios together in lockstep (see propbatch). This is only
+#               faster when most function updates have a vectorized form. With workers, the
+#               scenarios are split into a batch for each worker.
+#        times, the times to inject the faults at (mdl.times if not given)
+#        dedup, whether to only run one scenario of each class of equivalent scenarios 
+#               (see findequivalents), giving its results to the others in the class
+#        histpath, a directory to keep the flow histories of every scenario in (see 
+#               createhiststore), if given. Batches are not used when keeping histories.
+#        journal, a file to journal the results of the scenarios in as they are completed
+#               (see openjournal), if given. If the sweep is stopped, running it again with
+#               the same journal skips the scenarios already completed.
+#        profile, a profile to record the propagation of the scenarios run in (see PropProfile),
+#               if given
+#        stopearly, whether to stop simulating each scenario once it is back to nominal (see runonefault)
 # output: resultsdict, a dictionary with the results (may be deprecated in the future?)
 #         resultstab, a FMEA-style table of results
-def proplist(mdl):
+def proplist(mdl, workers=1, batch=False, times=[], dedup=False, histpath='', journal='', profile=None, stopearly=True):
+    from astropy.table import Table
     
-    graph=mdl.initialize()
-    times=mdl.times
+    graph=initgraph(mdl)
+    if not len(times):
+        times=mdl.times
     scenlist=listinitfaults(graph, times)
     resultsdict={} 
     
@@ -219,27 +330,518 @@ def proplist(mdl):
     rates=np.zeros(numofscens, dtype=float)
     costs=np.zeros(numofscens, dtype=float)
     expcosts=np.zeros(numofscens, dtype=float)
+    
+    #flow histories are written to the history store as each scenario completes. When resuming
+    #a sweep from its journal, the histories of the scenarios already completed are kept
+    if histpath:
+        faultyhists, written=createhiststore(histpath, mdl, scenlist, resume=bool(journal) and os.path.exists(journal))
+    #results are put in the table in the order of scenlist, so it is the same however it is run
+    allresults=[None]*numofscens
+    for i, endresults, hist in iterscens(mdl, scenlist, graph, workers, batch, dedup, hists=bool(histpath), journal=journal, profile=profile, stopearly=stopearly):
+        allresults[i]=endresults
+        if hist is not None:
+            faultyhists[i]=hist
+            written[i]=True
+    if histpath:
+        faultyhists.flush()
+        written.flush()
+        del faultyhists, written
 
-    for i, scen in enumerate(scenlist):
-        
-        endresults, resgraph, flowhist, graphhist=runonefault(mdl, scen)
+    for i, (scen, endresults) in enumerate(zip(scenlist, allresults)):
         
         resultsdict[scen['properties']['function'],scen['properties']['fault'], scen['properties']['time']]=endresults
         
-        fxns[i]=scen['properties']['function']
-        modes[i]=scen['properties']['fault']
-        times[i]=scen['properties']['time']
-        effects[i]=str(endresults['flows'])+str(endresults['faults'])        
-        rates[i]=endresults['classification']['rate']
-        costs[i]=endresults['classification']['cost']
-        expcosts[i]=endresults['classification']['expected cost']
+        fxns[i], modes[i], times[i], effects[i], rates[i], costs[i], expcosts[i]=makeresultrow(scen, endresults)
     
     vals=[fxns, modes, times, effects, rates, costs, expcosts]
-    cnames=['Function', 'Mode', 'Time', 'Effects', 'Rate', 'Cost', 'Expected Cost']
-    resultstab = Table(vals, names=cnames)
+    resultstab = Table(vals, names=resultnames)
     
     return resultsdict, resultstab
 
+#iterproplist
+# creates and propagates a list of failure scenarios in a model (see proplist), yielding the
+# results of each scenario as soon as it completes, rather than keeping them all until the 
+# end. Results can then be used while a long sweep runs (e.g. written with writeresults).
+# Scenarios are yielded in the order they complete, which with dedup or batch may differ 
+# from the order of the scenario list.
+# input: mdl, workers, batch, times, dedup, journal, profile, stopearly, see proplist
+# output: yields (scen, endresults) for each scenario, where endresults is as in runonefault
+#         (makeresultrow gives the row of the results table of the scenario)
+def iterproplist(mdl, workers=1, batch=False, times=[], dedup=False, journal='', profile=None, stopearly=True):
+    graph=initgraph(mdl)
+    if not len(times):
+        times=mdl.times
+    scenlist=listinitfaults(graph, times)
+    for i, endresults, hist in iterscens(mdl, scenlist, graph, workers, batch, dedup, journal=journal, profile=profile, stopearly=stopearly):
+        yield scenlist[i], endresults
+
+#iterscens
+# runs a list of scenarios (as set up in proplist), yielding their results as they complete
+# inputs: mdl, scenlist, the list of scenarios, graph, a graph of the model to run them in, 
+#         workers, batch, dedup, profile, stopearly, see proplist, hists, whether to get the flow history 
+#         of each scenario (see runhist), and journal, the file of a journal of the sweep to
+#         resume from and add to (see openjournal). Batches are not used when getting histories.
+# outputs: yields (i, endresults, hist), the index of each scenario in scenlist, its results,
+#          and its flow history (or None if not getting histories or resumed from the journal)
+def iterscens(mdl, scenlist, graph, workers=1, batch=False, dedup=False, hists=False, journal='', profile=None, stopearly=True):
+    #scenarios completed in the journal are given first, and the rest are run and added to it
+    if journal:
+        keys=[(scen['properties']['function'], scen['properties']['fault'], scen['properties']['time']) for scen in scenlist]
+        done, journalfile=openjournal(journal, mdl, keys)
+        with journalfile:
+            for i, key in enumerate(keys):
+                if key in done:
+                    yield i, done[key], None
+            todo=[i for i, key in enumerate(keys) if key not in done]
+            for run, endresults, hist in iterscens(mdl, [scenlist[i] for i in todo], graph, workers, batch, dedup, hists, profile=profile, stopearly=stopearly):
+                writejournal(journalfile, keys[todo[run]], endresults)
+                yield todo[run], endresults, hist
+        return
+    #with dedup, only the first scenario of each class of equivalent scenarios is run
+    if dedup:
+        classes, injwarnings=findequivalents(mdl, scenlist)
+    else:
+        classes, injwarnings=[[i] for i in range(len(scenlist))], {}
+    runlist=[scenlist[members[0]] for members in classes]
+    fanout=lambda runresults: fanoutresults(mdl, scenlist, classes, runresults, dedup, injwarnings)
+    
+    if workers>1 and batch and not hists:
+        batches=[list(range(len(runlist)))[i::workers] for i in range(workers)]
+        pool=ProcessPoolExecutor(max_workers=workers, initializer=initworker, initargs=getworkerargs(mdl))
+        with pool:
+            batchresults=pool.map(runworkerbatch, [[runlist[run] for run in runs] for runs in batches], \
+                                  itertools.repeat(bool(profile)), itertools.repeat(stopearly))
+            for runs, (results, runprofile) in zip(batches, batchresults):
+                if profile:
+                    profile.merge(runprofile)
+                yield from fanout((run, endresults, None) for run, endresults in zip(runs, results))
+    elif workers>1:
+        chunksize=max(1, len(runlist)//(4*workers))
+        pool=ProcessPoolExecutor(max_workers=workers, initializer=initworker, initargs=getworkerargs(mdl))
+        profiling=itertools.repeat(bool(profile))
+        stopearlies=itertools.repeat(stopearly)
+        with pool:
+            if hists:
+                runresults=pool.map(runworkerhist, runlist, profiling, stopearlies, chunksize=chunksize)
+            else:
+                runresults=((endresults, None, runprofile) for endresults, runprofile in pool.map(runworkerscen, runlist, profiling, stopearlies, chunksize=chunksize))
+            yield from fanout(mergeprofiles(runresults, profile))
+    elif batch and not hists:
+        yield from fanout((run, endresults, None) for run, endresults in enumerate(propbatch(mdl, runlist, stopearly, profile)))
+    else:
+        #the nominal run is simulated once here and reused by each scenario
+        nominaltraj(mdl)
+        #scenarios are run in the same graph, which is reset to the nominal state each time
+        if hists:
+            runresults=((run,)+runhist(mdl, scen, graph, profile, stopearly) for run, scen in enumerate(runlist))
+        else:
+            runresults=((run, runonefault(mdl, scen, graph=graph, stopearly=stopearly, profile=profile)[0], None) for run, scen in enumerate(runlist))
+        yield from fanout(runresults)
+
+#openjournal
+# opens the journal of a sweep, loading the results of the scenarios already completed in it.
+# The journal is a file of pickled records: a header with the model name and the keys 
+# (function, mode, time) of the scenarios in the sweep, followed by the key and endresults 
+# of each scenario as it is completed. A record cut short (e.g. by a crash while it was 
+# being written) is discarded, and the journal is continued from the last complete record.
+# inputs: path, the file of the journal, mdl, the model module, and keys, the keys of the scenarios
+# outputs: done, a dictionary of the endresults of the scenarios completed {key:endresults},
+#          and journalfile, the journal file opened to add to
+def openjournal(path, mdl, keys):
+    header={'model':mdl.__name__, 'scenarios':keys}
+    done={}
+    end=0
+    if os.path.exists(path):
+        with open(path, 'rb') as file:
+            try:
+                journalheader=pickle.load(file)
+                end=file.tell()
+                if journalheader!=header:
+                    raise ValueError('Journal '+path+' is of a different model or list of scenarios')
+                while True:
+                    key, endresults=pickle.load(file)
+                    done[key]=endresults
+                    end=file.tell()
+            except (EOFError, pickle.UnpicklingError):
+                pass
+    journalfile=open(path, 'ab')
+    journalfile.truncate(end)
+    if not end:
+        pickle.dump(header, journalfile)
+        journalfile.flush()
+    return done, journalfile
+
+#writejournal
+# adds the results of a completed scenario to the journal of a sweep (see openjournal), 
+# making sure it is written to disk before the sweep continues
+def writejournal(journalfile, key, endresults):
+    pickle.dump((key, endresults), journalfile)
+    journalfile.flush()
+    os.fsync(journalfile.fileno())
+
+#mergeprofiles
+# merges the profiles of the runs of scenarios in worker processes into the profile of a sweep
+# (see iterscens), giving the results of each run
+# inputs: runresults, the (endresults, hist, profile) of each run, and profile, the profile of the sweep
+# outputs: yields (run, endresults, hist) for each run
+def mergeprofiles(runresults, profile):
+    for run, (endresults, hist, runprofile) in enumerate(runresults):
+        if profile:
+            profile.merge(runprofile)
+        yield run, endresults, hist
+
+#fanoutresults
+# gives the results of each run to the scenarios in its class (see iterscens). Scenarios in 
+# a class have the same history as the run from their own injection time, and the nominal
+# history before it. Their warnings are the warning from their own injection (see 
+# findequivalents), if any, and the warnings of the run after it.
+def fanoutresults(mdl, scenlist, classes, runresults, dedup, injwarnings={}):
+    for run, endresults, hist in runresults:
+        for i in classes[run]:
+            if not dedup:
+                yield i, endresults, hist
+            elif i==classes[run][0]:
+                yield i, dict(endresults), hist
+            else:
+                time=scenlist[i]['properties']['time']
+                memberresults=dict(endresults)
+                memberresults['warnings']=[warning for warning in endresults['warnings'] if warning['time']>time]
+                if i in injwarnings:
+                    memberresults['warnings'].insert(0, injwarnings[i])
+                if hist is None:
+                    yield i, memberresults, hist
+                else:
+                    memberhist=hist.copy()
+                    memberhist[:time-mdl.times[0]]=nominalhist(mdl)[:time-mdl.times[0]]
+                    yield i, memberresults, memberhist
+
+#resultnames
+# the names of the columns of the table of results from proplist
+resultnames=['Function', 'Mode', 'Time', 'Effects', 'Rate', 'Cost', 'Expected Cost']
+
+#makeresultrow
+# makes the row of the table of results (see proplist) for the results of a scenario
+# inputs: scen, the fault scenario, and endresults, its results from runonefault
+# outputs: row, a list of the values in the row, in the order of resultnames
+def makeresultrow(scen, endresults):
+    return [scen['properties']['function'], scen['properties']['fault'], scen['properties']['time'],
+            str(endresults['flows'])+str(endresults['faults']), endresults['classification']['rate'],
+            endresults['classification']['cost'], endresults['classification']['expected cost']]
+
+#writeresults
+# writes the results of scenarios to a csv file row by row as they are given (e.g. by 
+# iterproplist), so the table of results is built up while a sweep runs and does not have to
+# be kept in memory. The file can be read as a table with Table.read(filename, format='csv')
+# inputs:
+#   - results, an iterable of (scen, endresults) for each scenario
+#   - filename, the name of the file to write
+#   - append, whether to add the rows to the end of an existing file
+# outputs: numrows, the number of rows written
+def writeresults(results, filename, append=False):
+    numrows=0
+    newfile=not append or not os.path.exists(filename) or os.path.getsize(filename)==0
+    with open(filename, 'a' if append else 'w', newline='') as file:
+        writer=csv.writer(file)
+        if newfile:
+            writer.writerow(resultnames)
+        for scen, endresults in results:
+            writer.writerow(makeresultrow(scen, endresults))
+            #each row is written out as it comes, so the file is complete up to the last result
+            file.flush()
+            numrows+=1
+    return numrows
+
+#findequivalents
+# finds the classes of equivalent scenarios in a list of scenarios. Scenarios with the same
+# fault injected at different times are equivalent if the model is in the same state after
+# the later injection in both (e.g. when the function is idle between the times, or the 
+# mode is a no-op like 'nom'), since the rest of their runs are then the same. This is found
+# by simulating the earlier scenario from its injection up to the time of the later one, 
+# comparing each scenario with the class of the scenario of the same fault before it.
+# Since scenarios in a class only differ in injection time, they have the same results.
+# Comparing scenarios costs some simulation, so when few of the first comparisons find 
+# equivalent scenarios (e.g. when faults have a different effect at each time), the rest of
+# the scenarios are not compared and are left in classes of their own.
+# inputs:
+#   - mdl, the module where the model was set up
+#   - scenlist, a list of fault scenarios
+#   - sample, the number of comparisons to make before checking how many found equivalents
+#   - minratio, the fraction of comparisons which must find equivalents to keep comparing
+# outputs: 
+#   - classes, a list of the classes of equivalent scenarios, each a list of the indices
+#     of its scenarios in scenlist, the first of which is the one to simulate for the class
+#   - injwarnings, a dictionary {index: warning} of the warnings from propagating the 
+#     injection of the scenarios compared (see propagate), which are not in the results of
+#     the scenario simulated for their class
+def findequivalents(mdl, scenlist, sample=50, minratio=0.25):
+    graph=initgraph(mdl)
+    nomscen=constructnomscen(graph)
+    timerange=mdl.times
+    classes=[]
+    injwarnings={}
+    candidates={}
+    for i, scen in enumerate(scenlist):
+        injections=getinjections(scen)
+        time=scen['properties']['time']
+        #(scenarios with faults at more than one time, or outside the time range, are left as-is)
+        if len(injections)>1 or not timerange[0]<=time<=timerange[-1]:
+            classes.append([i])
+            continue
+        faults=tuple(sorted(injections.get(time, {}).items()))
+        key=(str(scen['properties'].get('function')), str(scen['properties'].get('fault')), faults)
+        candidates.setdefault(key, []).append(i)
+    #faults are compared in an order spread over the list, so the first comparisons are a fair sample
+    groups=list(candidates.values())
+    stride=max(1, len(groups)//max(1, sample))
+    groups=[group for start in range(stride) for group in groups[start::stride]]
+    compared=0
+    merged=0
+    for members in groups:
+        #each scenario is compared with the class of the scenario before it, which keeps the 
+        #state of its first scenario simulated up to the time of the comparison
+        rep=None
+        for i in sorted(members, key=lambda i: scenlist[i]['properties']['time']):
+            if compared>=sample and merged<minratio*compared:
+                classes.append([i])
+                continue
+            time=scenlist[i]['properties']['time']
+            setstate(graph, nominalcheckpoint(mdl, time)[1])
+            warning=propagate(graph, getinjections(scenlist[i]).get(time, nomscen['faults']), time)
+            if warning:
+                injwarnings[i]=warning
+            state=getstate(graph)
+            if rep and rep['time']<time:
+                setstate(graph, rep['state'])
+                for rtime in range(rep['time']+1, time+1):
+                    propagate(graph, nomscen['faults'], rtime)
+                rep['state']=getstate(graph)
+                rep['time']=time
+            if rep:
+                compared+=1
+            if rep and samestate(rep['state'], state):
+                rep['members'].append(i)
+                merged+=1
+            else:
+                rep={'time':time, 'state':state, 'members':[i]}
+                classes.append(rep['members'])
+    classes.sort(key=lambda members: members[0])
+    return classes, injwarnings
+
+#propsweep
+# runs a sweep of each fault mode in the model injected at each of a range of times. Every 
+# faulty run starts from the state of the nominal run at its injection time (see 
+# nominalcheckpoint), so the nominal part of the runs (their shared prefix) is only 
+# simulated once for the whole sweep, which makes injecting at every time-step affordable.
+# inputs:
+#   - mdl, the module where the model was set up
+#   - times, the times to inject the faults at (every time-step in the model time range if not given)
+#   - workers, batch, dedup, how to run the scenarios (see proplist)
+# outputs:
+#   - resultsdict, resultstab, the results of each scenario (see proplist)
+#   - curves, the sensitivity of the results of each fault mode to its injection time (see findsensitivity)
+def propsweep(mdl, times=[], workers=1, batch=False, dedup=False):
+    if not len(times):
+        times=list(range(mdl.times[0], mdl.times[-1]+1))
+    resultsdict, resultstab=proplist(mdl, workers=workers, batch=batch, times=times, dedup=dedup)
+    curves=findsensitivity(resultsdict)
+    return resultsdict, resultstab, curves
+
+#findsensitivity
+# finds how the results of each fault mode change with the time it is injected
+# inputs: resultsdict, a dictionary of results from proplist or propsweep
+# outputs: curves, a dictionary with structure
+#   {(function, mode): {times:array, rate:array, cost:array, expected cost:array, degraded flows:array}}
+#   where each array has the result of injecting the mode at each time (in order of time), and 
+#   degraded flows is the number of flows degraded at the end of the run
+def findsensitivity(resultsdict):
+    scentimes={}
+    for fxnname, mode, time in resultsdict:
+        scentimes.setdefault((fxnname, mode), []).append(time)
+    curves={}
+    for (fxnname, mode), times in scentimes.items():
+        times=sorted(times)
+        results=[resultsdict[fxnname, mode, time] for time in times]
+        curves[fxnname, mode]={'times':np.array(times)}
+        for metric in ['rate', 'cost', 'expected cost']:
+            curves[fxnname, mode][metric]=np.array([result['classification'][metric] for result in results], dtype=float)
+        curves[fxnname, mode]['degraded flows']=np.array([len(result['flows']) for result in results])
+    return curves
+
+#propmultifaults
+# propagates the multi-fault scenarios of a model (see listmultifaults). Faults are only 
+# simulated together if their effects can interact: each fault (or group of faults) has a 
+# footprint of the functions it affects, i.e. the functions it is injected in and those on
+# flows that are degraded at the end of any time-step of its run. Groups with overlapping 
+# footprints are simulated together (and merged until no footprints overlap), while the 
+# outcomes of groups which cannot interact are reused from their own runs (e.g. the 
+# single-fault runs) and combined into the result of the scenario (see combinestates).
+# inputs:
+#   - mdl, the module where the model was set up
+#   - numfaults, the number of faults in each scenario (e.g. 2 or 3)
+#   - times, the times to inject the faults at (mdl.times if not given)
+#   - simultaneous, whether faults are only combined with faults at the same time
+# outputs:
+#   - resultsdict, a dictionary of the endresults of each scenario (see runonefault) by 
+#     the keys (function, mode, time) of its faults
+#   - resultstab, a FMEA-style table of results, where Simulated is whether the faults of 
+#     the scenario were simulated together (or the outcomes of their own runs were combined)
+def propmultifaults(mdl, numfaults=2, times=[], simultaneous=True):
+    from astropy.table import Table
+    graph=initgraph(mdl)
+    if not len(times):
+        times=mdl.times
+    scenlist=listmultifaults(graph, times, numfaults, simultaneous)
+    nominaltraj(mdl)
+    nomstate=nominalrun(mdl)['states'][mdl.times[-1]]
+    #outcomes of runs of the groups of faults, by the keys of their faults
+    outcomes={}
+    resultsdict={}
+    rows=[]
+    for scen in scenlist:
+        groups=[(single,) for single in scen['properties']['singles']]
+        merging=True
+        while merging:
+            merging=False
+            for group1, group2 in itertools.combinations(groups, 2):
+                footprint1=runfaultgroup(mdl, group1, graph, outcomes)['footprint']
+                footprint2=runfaultgroup(mdl, group2, graph, outcomes)['footprint']
+                if footprint1 & footprint2:
+                    groups.remove(group1)
+                    groups.remove(group2)
+                    groups.append(tuple(sorted(group1+group2)))
+                    merging=True
+                    break
+        if len(groups)==1:
+            #if all of the faults interact, the scenario is simulated as-is
+            endresults=runonefault(mdl, scen, graph=graph)[0]
+        else:
+            states=[runfaultgroup(mdl, group, graph, outcomes)['state'] for group in groups]
+            setstate(graph, combinestates(nomstate, states))
+            resgraph=makeresultsgraph(graph, nominaltraj(mdl)[mdl.times[-1]])
+            endflows, endfaults, endclass = classifyresults(mdl,resgraph, scen)
+            endresults={'flows': endflows, 'faults': endfaults, 'classification':endclass,
+                        'warnings':[warning for group in groups for warning in outcomes[group]['warnings']]}
+        endflows, endfaults, endclass=endresults['flows'], endresults['faults'], endresults['classification']
+        resultsdict[tuple(scen['properties']['singles'])]=endresults
+        rows.append([', '.join(scen['properties']['function']), ', '.join(scen['properties']['fault']),
+                     ', '.join([str(faulttime) for faulttime in scen['properties']['faulttimes'].values()]),
+                     str(endflows)+str(endfaults), endclass['rate'], endclass['cost'], 
+                     endclass['expected cost'], len(groups)<numfaults])
+    cnames=['Functions', 'Modes', 'Times', 'Effects', 'Rate', 'Cost', 'Expected Cost', 'Simulated']
+    if rows:
+        resultstab=Table(rows=rows, names=cnames)
+    else:
+        resultstab=Table(names=cnames)
+    return resultsdict, resultstab
+
+#runfaultgroup
+# runs a group of faults from a multi-fault scenario together (if not already run), finding
+# the state of the model at the end of the run and the footprint of the functions it affects
+# inputs:
+#   - mdl, the module where the model was set up
+#   - group, a tuple of the keys (function, mode, time) of the faults
+#   - graph, the graph to run the faults in
+#   - outcomes, a dictionary of the outcomes of groups already run
+# outputs: outcome, a dictionary with structure {state:state, footprint:{functions}, warnings:[warnings]}
+def runfaultgroup(mdl, group, graph, outcomes):
+    if group not in outcomes:
+        groupscen=constructfaultscen(graph, group)
+        endresults, resgraph, flowhist, graphhist=runonefault(mdl, groupscen, track='all', graph=graph)
+        index=getindex(graph)
+        footprint={fxnname for fxnname, mode, time in group}
+        footprint.update(endresults['faults'])
+        for flow, hist in flowhist['faulty'].items():
+            if any(np.any(hist[var]!=flowhist['nominal'][flow][var]) for var in hist):
+                footprint.update(index['subscribers'][flow])
+        outcomes[group]={'state':getstate(graph), 'footprint':footprint, 'warnings':endresults['warnings']}
+    return outcomes[group]
+
+#combinestates
+# combines the states of the model from runs of faults which cannot interact, by taking 
+# the parts of the state which differ from the nominal state from the run they differ in
+# inputs: nomstate, the nominal state of the model, and states, a list of states of the model
+# outputs: state, the combined state
+def combinestates(nomstate, states):
+    nomvector, nomobjstates=nomstate
+    if nomvector is not None:
+        vector=nomvector.copy()
+        for statevector, objstates in states:
+            differences=statevector!=nomvector
+            vector[differences]=statevector[differences]
+    else:
+        vector=None
+    objstates=list(nomobjstates)
+    for statevector, stateobjs in states:
+        for i, objstate in enumerate(stateobjs):
+            try:
+                same=objstate==nomobjstates[i]
+            except ValueError:
+                same=False
+            if not same:
+                objstates[i]=objstate
+    return vector, tuple(objstates)
+
+#workermdl, workergraph
+# the model module and graph used to run scenarios in a worker process (see initworker)
+workermdl=None
+workergraph=None
+
+#initworker
+# sets up a worker process for running scenarios in parallel. The model module is imported
+# (and its graph initialized and nominal run simulated) once per worker rather than once per scenario
+# inputs: mdlname, the name of the model module (e.g. 'quad_mdl'), and spec, the arguments 
+#         to make the model with, for models made by a generator module (see getworkerargs)
+def initworker(mdlname, spec=None):
+    global workermdl, workergraph
+    workermdl=importlib.import_module(mdlname)
+    if spec is not None:
+        workermdl=workermdl.makemodel(**spec)
+    workergraph=initgraph(workermdl)
+    nominaltraj(workermdl)
+
+#getworkerargs
+# gets the arguments to set up a worker process for a model with (see initworker). Models
+# made by a generator module (e.g. synth_mdl) rather than defined in a module of their own
+# give the name of the module in mdl.generator and the arguments to its makemodel in mdl.spec
+# inputs: mdl, the model module
+# outputs: mdlname, spec, the arguments of initworker
+def getworkerargs(mdl):
+    if hasattr(mdl, 'generator'):
+        return mdl.generator, mdl.spec
+    return mdl.__name__, None
+
+#runworkerscen
+# runs a scenario in a worker process set up with initworker
+# inputs: scen, the fault scenario, profiling, whether to profile the run (see PropProfile),
+#         and stopearly, whether to stop the run once it is back to nominal (see runonefault)
+# outputs: endresults, the dictionary summary of results at the end of the simulation (see runonefault),
+#          and profile, the profile of the run (or None if not profiling)
+def runworkerscen(scen, profiling=False, stopearly=True):
+    profile=PropProfile() if profiling else None
+    endresults, resgraph, flowhist, graphhist=runonefault(workermdl, scen, graph=workergraph, stopearly=stopearly, profile=profile)
+    return endresults, profile
+
+#runworkerhist
+# runs a scenario in a worker process set up with initworker, getting its flow history
+# inputs: scen, the fault scenario, profiling, whether to profile the run (see PropProfile),
+#         and stopearly, whether to stop the run once it is back to nominal (see runonefault)
+# outputs: endresults, hist, the results and flow history of the scenario (see runhist), 
+#          and profile, the profile of the run (or None if not profiling)
+def runworkerhist(scen, profiling=False, stopearly=True):
+    profile=PropProfile() if profiling else None
+    endresults, hist=runhist(workermdl, scen, workergraph, profile, stopearly)
+    return endresults, hist, profile
+
+#runworkerbatch
+# runs a batch of scenarios (see propbatch) in a worker process set up with initworker
+# inputs: scenlist, the list of fault scenarios, profiling, whether to profile the batch 
+#         (see PropProfile), and stopearly, whether to stop each scenario once it is back to nominal
+# outputs: allresults, a list of the endresults of each scenario, and profile, the profile 
+#          of the batch (or None if not profiling)
+def runworkerbatch(scenlist, profiling=False, stopearly=True):
+    profile=PropProfile() if profiling else None
+    return propbatch(workermdl, scenlist, stopearly, profile), profile
+
 #classifyresults
 # finds whether conditional faults have been added, flows are degraded, and how bad that is per the model definition
 # inputs:
@@ -261,117 +863,444 @@ def classifyresults(mdl,resgraph, scen):
 # inputs:
 #   - mdl, the model module defined in mdl.py
 #   - scen, the fault scenario for a given model
-#   - track, a list of flows to track
+#   - track, a list of flows to track (or 'all' to track every flow)
 #   - gtrack, the times to take a snapshot of the graph 
+#   - graph, a graph of the model to run the scenario in (its state is overwritten). If not
+#     given, a new graph is initialized. Reusing a graph saves initializing one for each
+#     scenario, but note that results graphs share the flow and function objects of the graph.
+#   - stopearly, whether to stop simulating the scenario once it has returned to the nominal
+#     state (see findsettled), filling in the rest of the run from the nominal run
+#   - profile, a profile to record the propagation of the scenario in (see PropProfile), if given
+#   - trace, a trace to record the events of the propagation of the scenario in (see PropTrace), if given
 # outputs:
 #   - endresults, a dictionary summary of results at the end of the simulation with structure
-#    {flows:{flow:attribute:value},faults:{function:{faults}}, classification:{rate:val, cost:val, expected cost: val} }
+#    {flows:{flow:attribute:value},faults:{function:{faults}}, classification:{rate:val, cost:val, expected cost: val},
+#     warnings:[warning]} where warnings are the warnings from propagation (see propagate)
 #   - resgraph, a graph object with function faults and degraded flows noted
-#   - flowhist, a dictionary with the history of the flow over time
+#   - flowhist, a dictionary with the history of the flow over time (see inithist)
 #   - graphhist, a dictionary of results graph objects over time with structure {time:graph}
-def runonefault(mdl, scen, track={}, gtrack={}):
-    nomgraph=mdl.initialize()
-    nomscen=constructnomscen(nomgraph)
-    graph=mdl.initialize()
+def runonefault(mdl, scen, track={}, gtrack={}, graph=[], stopearly=True, profile=None, trace=None):
+    props=scen['properties']
+    if profile or trace:
+        scenstart=perf_counter()
+    if trace:
+        trace.startscen(str((props['function'], props['fault'], props['time'])))
+    nomtraj=nominaltraj(mdl)
     timerange=mdl.times
     flowhist={}
     graphhist={}
-    time=scen['properties']['time']
+    injections=getinjections(scen)
+    time=min(injections, default=scen['properties']['time'])
+    lasttime=max(injections, default=time)
+    #the faulty run is identical to the nominal run until the fault is injected (or
+    #the first graph snapshot), so it is started from the nominal state at that time
+    starttime=min([time]+[t for t in gtrack if t>=timerange[0]])
+    cptime, cpstate=nominalcheckpoint(mdl, starttime)
+    if not graph:
+        graph=initgraph(mdl)
+    graph.graph['profile']=profile
+    graph.graph['trace']=trace
+    setstate(graph, cpstate)
+    nomscen=constructnomscen(graph)
+    if track=='all':
+        track=list(getindex(graph)['flows'])
     if track:
-        for runtype in ['nominal','faulty']:
-            flowhist[runtype]={}
-            for flow in track:
-                flowobj=getflow(flow, graph)
-                flowhist[runtype][flow]=flowobj.status()
-                for var in flowobj.status():
-                    flowhist[runtype][flow][var]=[]
+        flowhist, vechist, statustrack=inithist(graph, track, timerange)
     
+    #once the faulty run has settled (see findsettled), the rest of it is not simulated
+    settled=''
+    warnings=[]
     for rtime in range(timerange[0], timerange[-1]+1):
-        propagate(nomgraph, nomscen['faults'], rtime)
-        if rtime==time:
-            propagate(graph, scen['faults'], rtime)
+        if rtime<cptime or settled:
+            warning=None
+        elif rtime in injections:
+            warning=propagate(graph, injections[rtime], rtime)
         else:
-            propagate(graph,nomscen['faults'],rtime)
+            warning=propagate(graph,nomscen['faults'],rtime)
+        if warning:
+            warnings.append(warning)
+        if stopearly and not settled and rtime>=lasttime:
+            settled=findsettled(mdl, graph, rtime, scen['faults'])
+        #before the checkpoint and after returning to nominal, the faulty run is the nominal run
+        atnominal=rtime<cptime or settled=='nominal'
         if track:
-            for flow in track:
-                flowobj=getflow(flow, graph)
-                nomflowobj=getflow(flow, nomgraph)
-                for var in flowobj.status():
-                    flowhist['nominal'][flow][var]=flowhist['nominal'][flow][var]+[nomflowobj.status()[var]]
-                    flowhist['faulty'][flow][var]=flowhist['faulty'][flow][var]+[flowobj.status()[var]]
+            #flows in the state vector are recorded by writing the vector into a row of the history
+            if vechist:
+                nomvector=nomtraj[rtime]['vector']
+                vechist['nominal'][rtime-timerange[0]]=nomvector
+                if atnominal:
+                    vechist['faulty'][rtime-timerange[0]]=nomvector
+                else:
+                    vechist['faulty'][rtime-timerange[0]]=graph.graph['statevector']['vector']
+            for flow in statustrack:
+                nomstatus=nomtraj[rtime]['flows'][flow]
+                if atnominal:
+                    status=nomstatus
+                else:
+                    status=getflow(flow, graph).status()
+                for var in status:
+                    flowhist['nominal'][flow][var][rtime-timerange[0]]=nomstatus[var]
+                    flowhist['faulty'][flow][var][rtime-timerange[0]]=status[var]
         if rtime in gtrack:
-            rgraph=makeresultsgraph(graph,nomgraph)
+            if settled=='nominal':
+                setstate(graph, nominalrun(mdl)['states'][rtime])
+            rgraph=makeresultsgraph(graph,nomtraj[rtime])
             graphhist[rtime]=rgraph
-            
-    resgraph=makeresultsgraph(graph, nomgraph)        
+    if settled=='nominal':
+        setstate(graph, nominalrun(mdl)['states'][timerange[-1]])
+    resgraph=makeresultsgraph(graph, nomtraj[timerange[-1]])        
     endflows, endfaults, endclass = classifyresults(mdl,resgraph, scen)
-    endresults={'flows': endflows, 'faults': endfaults, 'classification':endclass}
+    endresults={'flows': endflows, 'faults': endfaults, 'classification':endclass, 'warnings':warnings}
+    if profile:
+        profile.scens[props['function'], props['fault'], props['time']]=perf_counter()-scenstart
+    if trace:
+        trace.addevent('scenario', 'scenario', scenstart, perf_counter()-scenstart, {'faults':scen['faults'], 'warnings':len(warnings)})
     return endresults, resgraph, flowhist, graphhist
 
+#findsettled
+# checks whether a faulty run has settled back into the nominal state after a time-step, 
+# in which case the rest of the run is the nominal run, which is already known. Runs which 
+# settle anywhere else (e.g. into a state which does not change over a time-step) are still 
+# simulated, since functions may change their behavior with time later in the run (e.g. a 
+# fault which only has an effect after a given time).
+# inputs:
+#   - mdl, the model module defined in mdl.py
+#   - g, the graph object of the faulty model
+#   - time, the time-step just simulated
+#   - faults, the faults injected in the run {function:mode}, which are checked first, if given
+# outputs:
+#   - settled, 'nominal' if the run returned to nominal, or '' if it has not settled
+def findsettled(mdl, g, time, faults={}):
+    nomrun=nominalrun(mdl)
+    nomstate=nomrun['traj'][time]
+    #the faults, state vector and flows are checked against the nominal trajectory first, so 
+    #the full state is only captured when needed (runs with a lasting fault never settle)
+    index=getindex(g)
+    for fxnname, mode in faults.items():
+        if mode!='nom' and mode in index['fxns'][fxnname].faults and mode not in nomstate['faults'][fxnname]:
+            return ''
+    nomfaults={'nom', 'nominal'}
+    for fxnname, fxn in index['fxns'].items():
+        if nomstate['faults'][fxnname]:
+            if findfault(fxnname, g)!=nomstate['faults'][fxnname]:
+                return ''
+        elif not fxn.faults.issubset(nomfaults):
+            return ''
+    if 'statevector' in g.graph and 'vector' in nomstate:
+        if not np.array_equal(g.graph['statevector']['vector'], nomstate['vector']):
+            return ''
+    try:
+        for flow, flowobj in index['flows'].items():
+            if flowobj.status()!=nomstate['flows'][flow]:
+                return ''
+    except ValueError:
+        #(statuses holding arrays are left to the comparison of the full states)
+        pass
+    if samestate(getstate(g), nomrun['states'][time]):
+        return 'nominal'
+    return ''
+
+#inithist
+# sets up the history of tracked flows over a run, with an array preallocated for each
+# attribute over the time range (numeric attributes are stored as floats, others as objects).
+# For models with a state vector, the histories of flows in the vector are columns of
+# a history of the whole vector, which is recorded one row at a time.
+# inputs:
+#   - g, the graph object of the model
+#   - track, a list of flows to track
+#   - timerange, the times the model is run over (e.g. mdl.times)
+# outputs:
+#   - flowhist, a dictionary with structure {nominal/faulty: {flow: {attribute: values}}}, 
+#     where values is an array with the value of the attribute at each time in the time range
+#   - vechist, a dictionary of the history of the state vector {nominal/faulty: array}, 
+#     where each row is the vector at a time (or None if no tracked flows are in the vector)
+#   - statustrack, a list of the tracked flows to be recorded using their status
+def inithist(g, track, timerange):
+    numtimes=timerange[-1]-timerange[0]+1
+    flowhist={'nominal':{}, 'faulty':{}}
+    vechist=None
+    statustrack=[]
+    if 'statevector' in g.graph:
+        statevector=g.graph['statevector']
+        vecflows=[flow for flow in track if flow in statevector['layout'][:,0] and flow not in statevector['partflows']]
+        if vecflows:
+            vechist={runtype:np.zeros((numtimes, len(statevector['vector']))) for runtype in flowhist}
+    else:
+        vecflows=[]
+    for flow in track:
+        flowobj=getflow(flow, g)
+        if flow in vecflows:
+            names=dict(zip(flowobj.statevars, flowobj.statenames or flowobj.statevars))
+            for runtype in flowhist:
+                flowhist[runtype][flow]={names[var]:vechist[runtype][:, slot] for var, slot in flowobj.vecslots.items()}
+            continue
+        statustrack.append(flow)
+        for runtype in flowhist:
+            flowhist[runtype][flow]={}
+            for var, value in flowobj.status().items():
+                if isinstance(value, (int, float, np.number)):
+                    flowhist[runtype][flow][var]=np.zeros(numtimes, dtype=float)
+                else:
+                    flowhist[runtype][flow][var]=np.empty(numtimes, dtype=object)
+    return flowhist, vechist, statustrack
+
+#nomcache
+# the cache of nominal runs used by nominaltraj, keyed by model and time range
+nomcache={}
+
+#nominaltraj
+# gets the nominal trajectory of the model. The nominal run is only simulated 
+# once per model and time range and is cached in nomcache thereafter, so that
+# the scenarios in a list do not each re-run it for comparison
+# inputs:
+#   - mdl, the model module defined in mdl.py
+# outputs:
+#   - nomtraj, a dictionary of the state of the model at each time step with structure:
+#       {time: {flows:{flow:{attribute:value}}, faults:{function:{faults}}, (vector:array)}}
+#       where vector is the state vector of the model (for models with one)
+def nominaltraj(mdl):
+    return nominalrun(mdl)['traj']
+
+#nominalcheckpoint
+# gets the state of the nominal model at a given time, which faulty runs are started from.
+# Since the state at the start of a time-step is the state after the previous one, any 
+# time in the model time range can be started from without simulating the nominal run again.
+# inputs:
+#   - mdl, the model module defined in mdl.py
+#   - time, the time the model is needed at (e.g. the time a fault is injected)
+# outputs:
+#   - cptime, the time of the checkpoint (the given time, within the model time range). 
+#     The state is captured before propagation at that time.
+#   - cpstate, the state of the model (see getstate)
+def nominalcheckpoint(mdl, time):
+    nomrun=nominalrun(mdl)
+    timerange=mdl.times
+    cptime=min(max(time, timerange[0]), timerange[-1])
+    if cptime==timerange[0]:
+        return cptime, nomrun['initstate']
+    return cptime, nomrun['states'][cptime-1]
+
+#nominalrun
+# simulates the nominal run of the model (if not already cached in nomcache), 
+# recording its state at each time step and capturing the full model state after 
+# each time step (and before the first) for faulty runs to start from
+# inputs:
+#   - mdl, the model module defined in mdl.py
+# outputs:
+#   - nomrun, a dictionary with structure 
+#       {traj: nomtraj, initstate:state, states:{time:state}, steadytime:time}
+#       where initstate is the state of the model before the first time step, states are 
+#       the states of the model after each time step, and steadytime is the time after 
+#       which the state no longer changes
+def nominalrun(mdl):
+    timerange=mdl.times
+    #the initialize function is used in the key so reloaded models are re-simulated
+    key=(mdl.__name__, mdl.initialize, timerange[0], timerange[-1])
+    if key not in nomcache:
+        nomgraph=initgraph(mdl)
+        nomscen=constructnomscen(nomgraph)
+        nomtraj={}
+        initstate=getstate(nomgraph)
+        states={}
+        if 'statevector' in nomgraph.graph:
+            vector=nomgraph.graph['statevector']['vector']
+            vechist=np.zeros((timerange[-1]-timerange[0]+1, len(vector)))
+        for rtime in range(timerange[0], timerange[-1]+1):
+            propagate(nomgraph, nomscen['faults'], rtime)
+            states[rtime]=getstate(nomgraph)
+            nomtraj[rtime]=getgraphstate(nomgraph)
+            #the state vector at each time is kept as a row of the history
+            if 'statevector' in nomgraph.graph:
+                vechist[rtime-timerange[0]]=vector
+                nomtraj[rtime]['vector']=vechist[rtime-timerange[0]]
+        steadytime=timerange[-1]
+        while steadytime>timerange[0] and samestate(states[steadytime-1], states[timerange[-1]]):
+            steadytime-=1
+        nomcache[key]={'traj':nomtraj, 'initstate':initstate, 'states':states, 'steadytime':steadytime}
+    return nomcache[key]
+
+#clearnomcache
+# empties the cache of nominal runs (e.g. if a model has been changed in place)
+def clearnomcache():
+    nomcache.clear()
+
+#getgraphstate
+# gets the state of the flows and function faults in a graph at a single time
+# inputs: g, the graph object of the model
+# outputs: state, a dictionary with structure {flows:{flow:{attribute:value}}, faults:{function:{faults}}}
+def getgraphstate(g):
+    state={'flows':{}, 'faults':{}}
+    for edge in g.edges:
+        for flow in g.edges[edge]:
+            state['flows'][flow]=g.edges[edge][flow].status()
+    for fxnname in g.nodes:
+        state['faults'][fxnname]=findfault(fxnname, g)
+    return state
+
 #propogate
 # propagates faults through the graph at one time-step
+# Every function is updated once at the start of the time step, after which only 
+# functions connected to a flow that has changed are updated again. Functions are 
+# updated in the order given by getindex. A function which changes its own flows is updated
+# again in the same pass, so acyclic parts of the model settle in a single pass (a new pass
+# only starts when the update order wraps around). When there have been more passes through the 
+# update order than there are functions, the state of the flows (and faults) at the start 
+# of each pass is recorded, so if the same state comes up again within the time-step 
+# (i.e., the model oscillates), propagation stops immediately.
+# (The state of the flows includes the last seen states of the flows and the functions left
+# to update, but not the internal states of the functions)
 # inputs:
 #   g, the graph object of the model
 #   initfaults, the faults (or lack of faults) to initiate in the model
 #   time, the time propogation occurs at
+# outputs:
+#   warning, None if propagation converged, or a dictionary with structure 
+#   {type: 'oscillation' or 'nonconvergence', time:time, passes:number, functions:[fxns], flows:[flows]}
+#   where passes is the number of passes in the cycle (or the total number of passes if it
+#   did not converge) and functions/flows are those updated/changed in the cycle (or last pass)
+# If the graph has a profile in g.graph['profile'] (see PropProfile) or a trace in g.graph['trace']
+# (see PropTrace), the updates and passes are recorded in it
 def propagate(g, initfaults, time):
-    fxnnames=list(g.nodes())
-    activefxns=set(fxnnames)
-    #set up history of flows to see if any has changed
-    tests={}
+    profile=g.graph.get('profile')
+    trace=g.graph.get('trace')
+    if trace:
+        stepstart=perf_counter()
+    index=getindex(g)
+    fxns=index['fxns']
+    flows=index['flows']
+    fxnflows=index['fxnflows']
+    subscribers=index['subscribers']
+    order=index['order']
+    rank=index['rank']
+    #set up history of flows to see if any has changed. The state of a flow is 
+    #only compared with its history if its token has changed (see getflowtoken)
+    flowtokens={}
     flowhist={}
-    for fxnname in fxnnames:
-        tests[fxnname]=0
-        edges=list(g.in_edges(fxnname))+list(g.out_edges(fxnname))
-        for big, end in edges:
-            flows=g.edges[big,end]
-            for flow in flows:
-                flowhist[big, end,flow]=g.edges[big, end][flow].status()
-                tests[fxnname]+=1
+    for flow in flows:
+        flowtokens[flow]=getflowtoken(flows[flow])
+        flowhist[flow]=getflowstate(flows[flow])
+    if profile:
+        profile.flowreads+=len(flows)
+        profile.statereads+=len(flows)
      #initialize fault           
     for fxnname in initfaults:
         if initfaults[fxnname]!='nom':
-            fxn=getfxn(fxnname, g)
+            fxn=fxns[fxnname]
+            if profile or trace:
+                start=perf_counter()
             fxn.updatefxn(faults=[initfaults[fxnname]], time=time)
+            if profile or trace:
+                duration=perf_counter()-start
+                if profile:
+                    profile.addcall(fxnname, duration)
+                if trace:
+                    trace.addupdate(time, 0, fxnname, [], start, duration, fault=initfaults[fxnname])
+    #functions to update are kept in a heap of their ranks in the update order
+    activeranks=list(range(len(order)))
+    activefxns=set(order)
+    #the functions updated and flows changed in each pass, and the pass each state was seen at
+    passes=[]
+    seenstates={}
+    lastrank=len(order)
+    warning=None
     n=0
-    while activefxns:
-        funclist=list(activefxns).copy()
-        for fxnname in funclist:
-            fxn=getfxn(fxnname, g)
-            fxn.updatefxn(time=time)
-            test=0
-            edges=list(g.in_edges(fxnname))+list(g.out_edges(fxnname))
-            for big, end in edges:
-                flows=g.edges[big,end]
-                for flow in flows:
-                    if g.edges[big, end][flow].status()!=flowhist[big, end, flow]:
-                        activefxns.add(big)
-                        activefxns.add(end)
-                    else:
-                        test+=1
-                    flowhist[big, end, flow]=g.edges[big, end][flow].status()
-                if test>=tests[fxnname]:
-                    activefxns.discard(fxnname)
+    while activeranks:
+        fxnrank=heapq.heappop(activeranks)
+        fxnname=order[fxnrank]
+        #a new pass starts when the update order wraps around (a function updated again after 
+        #changing its own flows stays in the same pass). States are only recorded once 
+        #there have been more passes than functions, which a converging model rarely needs.
+        #States are kept by value (not by hash), so states with the same hash are not confused
+        if fxnrank<lastrank and len(passes)>=len(order):
+            states=[getflowstate(flowobj) for flowobj in flows.values()]
+            statekey=hashablestate((states, flowhist, activefxns, [fxn.faults for fxn in fxns.values()]))
+            if statekey in seenstates:
+                warning=makepropwarning('oscillation', time, passes[seenstates[statekey]:])
+                break
+            seenstates[statekey]=len(passes)
+        if fxnrank<lastrank:
+            passes.append({'functions':[], 'flows':[]})
+        lastrank=fxnrank
+        activefxns.discard(fxnname)
+        if profile or trace:
+            firstflow=len(passes[-1]['flows'])
+            start=perf_counter()
+            fxns[fxnname].updatefxn(time=time)
+            duration=perf_counter()-start
+            if profile:
+                profile.addcall(fxnname, duration)
+                profile.flowreads+=len(fxnflows[fxnname])
+        else:
+            fxns[fxnname].updatefxn(time=time)
+        passes[-1]['functions'].append(fxnname)
+        for flow in fxnflows[fxnname]:
+            token=getflowtoken(flows[flow])
+            if token==flowtokens[flow]:
+                continue
+            flowtokens[flow]=token
+            if profile:
+                profile.statereads+=1
+            state=getflowstate(flows[flow])
+            if state!=flowhist[flow]:
+                flowhist[flow]=state
+                passes[-1]['flows'].append(flow)
+                for subfxn in subscribers[flow]:
+                    if subfxn not in activefxns:
+                        activefxns.add(subfxn)
+                        heapq.heappush(activeranks, rank[subfxn])
+        if trace:
+            trace.addupdate(time, len(passes), fxnname, passes[-1]['flows'][firstflow:], start, duration)
         n+=1
-        if n>1000:
-            print("Undesired looping in function")
-            print(initfaults)
-            print(fxnname)
+        if n>1000*len(order):
+            warning=makepropwarning('nonconvergence', time, passes[-1:], numpasses=len(passes))
             break
-    return
+    if profile:
+        profile.addstep(time, len(passes))
+    if trace:
+        trace.addstep(time, len(passes), stepstart, perf_counter()-stepstart, warning)
+    return warning
+
+#makepropwarning
+# makes the warning returned by propagate when it does not converge (see propagate)
+# inputs: warntype, the type of warning, time, the time of propagation, passes, the 
+#         passes in the cycle, and numpasses, the number of passes to report (if not len(passes))
+# outputs: warning, a dictionary describing the warning
+def makepropwarning(warntype, time, passes, numpasses=None):
+    functions=[]
+    flows=[]
+    for proppass in passes:
+        functions.extend([fxn for fxn in proppass['functions'] if fxn not in functions])
+        flows.extend([flow for flow in proppass['flows'] if flow not in flows])
+    if numpasses is None:
+        numpasses=len(passes)
+    return {'type':warntype, 'time':time, 'passes':numpasses, 'functions':functions, 'flows':flows}
+
+#hashablestate
+# converts a state (e.g. from getflowstate) into a hashable form, so states can be compared by hashing
+def hashablestate(value):
+    if isinstance(value, (list, tuple)):
+        return tuple([hashablestate(val) for val in value])
+    elif isinstance(value, dict):
+        return tuple([(key, hashablestate(val)) for key, val in value.items()])
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    elif isinstance(value, np.ndarray):
+        return (value.shape, value.tobytes())
+    return value
 
 #makeresultsgraph
 # creates a snapshot of the graph structure with model results superimposed
-# inputs: g, the graph, and nomg, the graph in its nominal state
+# inputs: g, the graph, and nomg, the graph in its nominal state 
+#         (or the nominal state of the graph at the same time from nominaltraj)
 # outputs: rg, the graph snapshot
 def makeresultsgraph(g, nomg):
+    degraded=finddegraded(g, nomg)
     rg=g.copy() 
     for edge in g.edges:
         for flow in list(g.edges[edge].keys()):
             flowobj=g.edges[edge][flow]
-            nomflowobj=nomg.edges[edge][flow]
             
-            if flowobj.status()!=nomflowobj.status():
+            if flow in degraded:
                 status='Degraded'
             else:
                 status='Nominal'
@@ -383,21 +1312,23 @@ def makeresultsgraph(g, nomg):
 
 #findfaultflows
 # extracts non-nominal flow paths by comparing the graph with a nominal version of the graph
-# inputs: g, the graph, and nomg, the graph in its nominal state
+# inputs: g, the graph, and nomg, the graph in its nominal state 
+#         (or the nominal state of the graph at the same time from nominaltraj)
 # outputs: 
 #           -endflows, a dict of degraded flows
 #           -endedges, a dict of degraded edges
 def findfaultflows(g, nomg=[]):
     endflows=dict()
     endedges=dict()
+    if nomg:
+        degraded=finddegraded(g, nomg)
     for edge in g.edges:
         flows=g.get_edge_data(edge[0],edge[1])
         flowedges=[]
         #if comparing a nominal with a non-nominal
         if nomg:
-            nomflows=nomg.get_edge_data(edge[0],edge[1])
             for flow in flows:
-                if flows[flow].status()!=nomflows[flow].status():
+                if flow in degraded:
                     endflows[flow]=flows[flow].status()
                     flowedges=flowedges+[flow]
         #if results are already in the graph structure
@@ -410,6 +1341,1183 @@ def findfaultflows(g, nomg=[]):
                 endedges[edge]=flowedges    
     return endflows, endedges
 
+#finddegraded
+# finds the flows which are not in their nominal state. If the model has a state vector,
+# the states in the vector are compared with the nominal states all at once.
+# inputs: g, the graph, and nomg, the graph in its nominal state 
+#         (or the nominal state of the graph at the same time from nominaltraj)
+# outputs: degraded, a set of the names of the degraded flows
+def finddegraded(g, nomg):
+    flows=getindex(g)['flows']
+    degraded=set()
+    checkflows=flows
+    if type(nomg) is dict:
+        nomvector=nomg.get('vector')
+    else:
+        nomvector=nomg.graph.get('statevector', {}).get('vector')
+    #(a graph bound to a batch has a state vector even if the nominal run did not)
+    if 'statevector' in g.graph and nomvector is not None:
+        statevector=g.graph['statevector']
+        differences=np.flatnonzero(statevector['vector']!=nomvector)
+        degraded.update(statevector['layout'][differences, 0])
+        #flows with states outside the vector still have to be compared individually
+        checkflows=statevector['partflows']
+    for flow in checkflows:
+        if flow not in degraded and flows[flow].status()!=getnomstatus(nomg, flow):
+            degraded.add(flow)
+    return degraded
+
+#getnomstatus
+# gets the nominal status of a flow, given either a nominal graph or a nominal state from nominaltraj
+def getnomstatus(nomg, flow):
+    if type(nomg) is dict:
+        nomstatus=nomg['flows'][flow]
+    else:
+        nomstatus=getflow(flow, nomg).status()
+    return nomstatus
+
+## RESULT STORAGE
+
+#storecolumns
+# the columns of a result store (see ResultStore) and their data types. Names are kept as
+# IDs, and the flows and faults of each row are flat columns ending at flowends/faultends
+storecolumns={'function':'i4', 'mode':'i4', 'time':'i8', 'rate':'f8', 'cost':'f8', 'expected cost':'f8',
+              'flows':'i4', 'flowends':'i8', 'faults':'i4', 'faultends':'i8'}
+
+#ResultStore
+# a columnar store on disk of the results of fault scenarios, which rows can be added to 
+# while a sweep runs (e.g. from iterproplist). Each column is kept in its own binary file in
+# the store directory, so columns can be memory-mapped when loaded (see loadresults) rather 
+# than parsed from text. Functions, modes, degraded flows and faults are kept as integer 
+# IDs, with the name of each ID in the metadata of the store (meta.json). The degraded 
+# flows and faults of each scenario are kept in flat columns, with the offset each row ends 
+# at in flowends and faultends. Rows are only part of the store once flushed, so a store 
+# is left consistent if a sweep is interrupted, and opening an existing store adds to it.
+# usage:
+#   with ResultStore('results') as store:
+#       for scen, endresults in iterproplist(mdl):
+#           store.append(scen, endresults)
+class ResultStore(object):
+    def __init__(self, path, flushevery=100):
+        self.path=path
+        self.flushevery=flushevery
+        os.makedirs(path, exist_ok=True)
+        self.meta=loadstoremeta(path)
+        self.ids={kind:{name:i for i, name in enumerate(names)} for kind, names in self.meta['names'].items()}
+        self.files={}
+        for column, dtype in storecolumns.items():
+            file=open(getstorefile(path, column), 'ab')
+            #anything written after the last flush (e.g. by an interrupted sweep) is discarded
+            file.truncate(getstorelength(self.meta, column)*np.dtype(dtype).itemsize)
+            self.files[column]=file
+        self.rows={column:[] for column in storecolumns}
+        self.lengths={'flows':self.meta['lengths']['flows'], 'faults':self.meta['lengths']['faults']}
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    #getid gets the ID of a name of a given kind (e.g. a flow), adding it if it is new
+    def getid(self, kind, name):
+        if name not in self.ids[kind]:
+            self.ids[kind][name]=len(self.meta['names'][kind])
+            self.meta['names'][kind].append(name)
+        return self.ids[kind][name]
+    #append adds the results of a scenario to the store
+    def append(self, scen, endresults):
+        props=scen['properties']
+        self.rows['function'].append(self.getid('function', str(props['function'])))
+        self.rows['mode'].append(self.getid('mode', str(props['fault'])))
+        self.rows['time'].append(props['time'])
+        for metric in ['rate', 'cost', 'expected cost']:
+            self.rows[metric].append(endresults['classification'][metric])
+        flows=[self.getid('flow', flow) for flow in endresults['flows']]
+        faults=[self.getid('fault', fxnname+' '+mode) for fxnname, modes in endresults['faults'].items() for mode in sorted(modes)]
+        self.rows['flows'].extend(flows)
+        self.rows['faults'].extend(faults)
+        self.lengths['flows']+=len(flows)
+        self.lengths['faults']+=len(faults)
+        self.rows['flowends'].append(self.lengths['flows'])
+        self.rows['faultends'].append(self.lengths['faults'])
+        if len(self.rows['function'])>=self.flushevery:
+            self.flush()
+    #flush writes the rows added since the last flush to the files of the store
+    def flush(self):
+        for column, dtype in storecolumns.items():
+            np.asarray(self.rows[column], dtype=dtype).tofile(self.files[column])
+            self.files[column].flush()
+        self.meta['numrows']+=len(self.rows['function'])
+        self.meta['lengths']=dict(self.lengths)
+        #the metadata is replaced as a whole, so it is never left partly written
+        metafile=os.path.join(self.path, 'meta.json')
+        with open(metafile+'.tmp', 'w') as file:
+            json.dump(self.meta, file)
+        os.replace(metafile+'.tmp', metafile)
+        self.rows={column:[] for column in storecolumns}
+    def close(self):
+        self.flush()
+        for file in self.files.values():
+            file.close()
+
+#loadstoremeta
+# loads the metadata of a result store (or makes the metadata of an empty store)
+def loadstoremeta(path):
+    metafile=os.path.join(path, 'meta.json')
+    if os.path.exists(metafile):
+        with open(metafile) as file:
+            return json.load(file)
+    return {'numrows':0, 'lengths':{'flows':0, 'faults':0}, 'names':{'function':[], 'mode':[], 'flow':[], 'fault':[]}}
+
+#getstorefile
+# gets the name of the file of a column in a result store
+def getstorefile(path, column):
+    return os.path.join(path, column.replace(' ', '_')+'.bin')
+
+#getstorelength
+# gets the number of values in a column of a result store
+def getstorelength(meta, column):
+    if column in meta['lengths']:
+        return meta['lengths'][column]
+    return meta['numrows']
+
+#writestore
+# writes the results of scenarios (e.g. from iterproplist) to a result store as they are given
+# inputs: results, an iterable of (scen, endresults), and path, the directory of the store
+# outputs: numrows, the number of rows in the store
+def writestore(results, path):
+    with ResultStore(path) as store:
+        for scen, endresults in results:
+            store.append(scen, endresults)
+    return store.meta['numrows']
+
+#loadresults
+# loads the columns of a result store, memory-mapping each column file
+# inputs: path, the directory of the store
+# outputs: results, a dictionary of the columns of the store (see storecolumns), with the 
+#          names of the IDs in results['names'] and the number of rows in results['numrows']
+def loadresults(path):
+    meta=loadstoremeta(path)
+    results={'names':meta['names'], 'numrows':meta['numrows']}
+    for column, dtype in storecolumns.items():
+        length=getstorelength(meta, column)
+        if length:
+            results[column]=np.memmap(getstorefile(path, column), dtype=dtype, mode='r', shape=(length,))
+        else:
+            results[column]=np.zeros(0, dtype=dtype)
+    return results
+
+#histlayout
+# gets the layout of the attributes of the flows in a history store (see createhiststore): 
+# the (flow, attribute) of each numeric attribute in the status of the flows of the model
+# Only numeric attributes can be kept in a store, so other attributes (e.g. strings) raise a TypeError
+# inputs: g, the graph of the model
+# outputs: layout, a list of [flow, attribute]
+def histlayout(g):
+    layout=[]
+    for flow, flowobj in getindex(g)['flows'].items():
+        for var, value in flowobj.status().items():
+            if not isinstance(value, (int, float, np.number)) or isinstance(value, (bool, np.bool_)):
+                raise TypeError('Attribute '+var+' of flow '+flow+' is a '+type(value).__name__+', which cannot be kept in a history store')
+            layout.append([flow, var])
+    return layout
+
+#nominalhist
+# gets the history of the nominal run of the model in the layout of a history store
+# inputs: mdl, the model module
+# outputs: nomhist, an array of the value of each attribute (column) at each time (row)
+def nominalhist(mdl):
+    nomrun=nominalrun(mdl)
+    if 'hist' not in nomrun:
+        layout=histlayout(initgraph(mdl))
+        nomtraj=nomrun['traj']
+        nomrun['hist']=np.array([[nomtraj[t]['flows'][flow][var] for flow, var in layout] for t in sorted(nomtraj)], dtype=float).reshape(len(nomtraj), len(layout))
+    return nomrun['hist']
+
+#runhist
+# runs a scenario (see runonefault), getting the history of each flow in the layout of a
+# history store (see createhiststore)
+# inputs: mdl, the model module, scen, the fault scenario, g, the graph to run it in, 
+#         profile, a profile to record the run in (see PropProfile), if given, and
+#         stopearly, whether to stop the run once it is back to nominal (see runonefault)
+# outputs: endresults, the results of the scenario, and hist, an array of the value of each
+#          attribute (column) at each time (row) in the faulty run
+def runhist(mdl, scen, g, profile=None, stopearly=True):
+    endresults, resgraph, flowhist, graphhist=runonefault(mdl, scen, track='all', graph=g, stopearly=stopearly, profile=profile)
+    layout=histlayout(g)
+    hist=np.array([flowhist['faulty'][flow][var] for flow, var in layout], dtype=float).reshape(len(layout), -1).T
+    return endresults, hist
+
+#createhiststore
+# creates a store on disk of the flow histories of a list of scenarios, which is a directory
+# with the nominal history (nominal.npy), an array of the faulty histories laid out as 
+# (scenario, time, attribute) (faulty.npy), whether the history of each scenario has been 
+# written (written.npy), and the layout of the attributes, times and scenario keys (meta.json).
+# The faulty histories are memory-mapped, so they can be written (and later read, see 
+# loadhists) one scenario at a time without being kept in memory. The faulty histories are 
+# not filled in when the store is created, so the file is only allocated as it is written.
+# inputs: path, the directory of the store, mdl, the model module, scenlist, the scenarios,
+#         and resume, whether to keep the histories in an existing store of the same scenarios
+#         (e.g. when resuming a sweep from a journal), which raises a ValueError if there is
+#         no such store
+# outputs: faultyhists, the memory-mapped array of faulty histories to write to, and
+#          written, the memory-mapped array of whether each history has been written
+def createhiststore(path, mdl, scenlist, resume=False):
+    layout=histlayout(initgraph(mdl))
+    times=list(range(mdl.times[0], mdl.times[-1]+1))
+    keys=[[scen['properties']['function'], scen['properties']['fault'], scen['properties']['time']] for scen in scenlist]
+    meta={'layout':layout, 'times':times, 'scenarios':keys}
+    metafile=os.path.join(path, 'meta.json')
+    faultyfile=os.path.join(path, 'faulty.npy')
+    writtenfile=os.path.join(path, 'written.npy')
+    shape=(len(scenlist), len(times), len(layout))
+    if resume:
+        if not all([os.path.exists(file) for file in [metafile, faultyfile, writtenfile]]):
+            raise ValueError('No history store to resume in '+path)
+        with open(metafile) as file:
+            if json.load(file)!=meta:
+                raise ValueError('History store '+path+' is of a different model or list of scenarios')
+        faultyhists=np.lib.format.open_memmap(faultyfile, mode='r+')
+        written=np.lib.format.open_memmap(writtenfile, mode='r+')
+        if faultyhists.shape!=shape or written.shape!=shape[:1]:
+            raise ValueError('History store '+path+' does not match its metadata')
+        return faultyhists, written
+    os.makedirs(path, exist_ok=True)
+    with open(metafile, 'w') as file:
+        json.dump(meta, file)
+    np.save(os.path.join(path, 'nominal.npy'), nominalhist(mdl))
+    faultyhists=np.lib.format.open_memmap(faultyfile, mode='w+', dtype=float, shape=shape)
+    written=np.lib.format.open_memmap(writtenfile, mode='w+', dtype=bool, shape=shape[:1])
+    return faultyhists, written
+
+#loadhists
+# loads a store of flow histories (see createhiststore), memory-mapping the faulty histories.
+# Histories of scenarios which have not been written (see written) are not meaningful, and 
+# are given as NaN by getflowhist.
+# inputs: path, the directory of the store
+# outputs: hists, a dictionary with structure {nominal:array, faulty:array, written:array, 
+#          layout:[[flow, attribute]], times:[times], scenarios:[(function, mode, time)]}
+def loadhists(path):
+    with open(os.path.join(path, 'meta.json')) as file:
+        hists=json.load(file)
+    hists['scenarios']=[tuple(key) for key in hists['scenarios']]
+    hists['nominal']=np.load(os.path.join(path, 'nominal.npy'))
+    hists['faulty']=np.load(os.path.join(path, 'faulty.npy'), mmap_mode='r')
+    hists['written']=np.load(os.path.join(path, 'written.npy'), mmap_mode='r')
+    return hists
+
+#getflowhist
+# gets the flow history of a scenario from a store of flow histories in the form of flowhist 
+# from runonefault, e.g. for plotflowhist
+# inputs: hists, the loaded store (see loadhists), and scenario, the key (function, mode, time)
+#         or index of the scenario
+# outputs: flowhist, a dictionary with structure {nominal/faulty: {flow: {attribute: values}}}
+def getflowhist(hists, scenario):
+    if type(scenario) is tuple:
+        scenario=hists['scenarios'].index(scenario)
+    flowhist={'nominal':{}, 'faulty':{}}
+    for i, (flow, var) in enumerate(hists['layout']):
+        flowhist['nominal'].setdefault(flow, {})[var]=hists['nominal'][:, i]
+        if hists['written'][scenario]:
+            flowhist['faulty'].setdefault(flow, {})[var]=hists['faulty'][scenario, :, i]
+        else:
+            flowhist['faulty'].setdefault(flow, {})[var]=np.full(len(hists['times']), np.nan)
+    return flowhist
+
+#loadtable
+# loads a result store as a FMEA-style table of results (as from proplist, but with the 
+# degraded flows and faults of each scenario in separate columns)
+# inputs: path, the directory of the store
+# outputs: resultstab, the table of results
+def loadtable(path):
+    from astropy.table import Table
+    results=loadresults(path)
+    names={kind:np.array(kindnames+[''], dtype=object) for kind, kindnames in results['names'].items()}
+    flowstarts=np.concatenate([[0], results['flowends'][:-1]]).astype(int)
+    faultstarts=np.concatenate([[0], results['faultends'][:-1]]).astype(int)
+    flows=[', '.join(names['flow'][results['flows'][start:end]]) for start, end in zip(flowstarts, results['flowends'])]
+    faults=[', '.join(names['fault'][results['faults'][start:end]]) for start, end in zip(faultstarts, results['faultends'])]
+    vals=[names['function'][results['function']].astype(str), names['mode'][results['mode']].astype(str), 
+          np.array(results['time']), np.array(flows, dtype=str), np.array(faults, dtype=str), 
+          np.array(results['rate']), np.array(results['cost']), np.array(results['expected cost'])]
+    cnames=['Function', 'Mode', 'Time', 'Degraded Flows', 'Faults', 'Rate', 'Cost', 'Expected Cost']
+    return Table(vals, names=cnames)
+
+## PROFILING
+
+#PropProfile
+# a profile of where the time goes in propagation, which is recorded when given to 
+# runonefault (or proplist). It keeps:
+#   - fxns, the number of updates and total time of the updates of each function {fxn:[calls, time]}
+#   - steps, the number of times each time-step was propagated, the total number of passes
+#     through the update order it needed, and the most passes it needed {time:[runs, passes, maxpasses]}
+#   - flowreads, the number of flows read to check for changes (see getflowtoken), and
+#     statereads, the number of flow states read (see getflowstate), which for flows not based
+#     on Flow are both calls to status()
+#   - scens, the wall time of each scenario {(function, mode, time):time}
+# Profiles of different runs can be combined with merge, and report gives a summary.
+# Propagation only checks whether it is being profiled, so there is next to no cost when it is not.
+# usage:
+#   profile=PropProfile()
+#   resultsdict, resultstab=proplist(mdl, profile=profile)
+#   print(profile.report())
+class PropProfile(object):
+    def __init__(self):
+        self.fxns={}
+        self.steps={}
+        self.flowreads=0
+        self.statereads=0
+        self.scens={}
+    #addcall records an update of a function (or a number of updates at once, as in a batch)
+    def addcall(self, fxnname, duration, calls=1):
+        if fxnname not in self.fxns:
+            self.fxns[fxnname]=[0, 0.0]
+        self.fxns[fxnname][0]+=calls
+        self.fxns[fxnname][1]+=duration
+    #addstep records the propagation of a time-step
+    def addstep(self, time, passes):
+        if time not in self.steps:
+            self.steps[time]=[0, 0, 0]
+        self.steps[time][0]+=1
+        self.steps[time][1]+=passes
+        self.steps[time][2]=max(self.steps[time][2], passes)
+    #merge adds the records of another profile (e.g. from a worker process)
+    def merge(self, other):
+        for fxnname, (calls, duration) in other.fxns.items():
+            if fxnname not in self.fxns:
+                self.fxns[fxnname]=[0, 0.0]
+            self.fxns[fxnname][0]+=calls
+            self.fxns[fxnname][1]+=duration
+        for time, (runs, passes, maxpasses) in other.steps.items():
+            if time not in self.steps:
+                self.steps[time]=[0, 0, 0]
+            self.steps[time][0]+=runs
+            self.steps[time][1]+=passes
+            self.steps[time][2]=max(self.steps[time][2], maxpasses)
+        self.flowreads+=other.flowreads
+        self.statereads+=other.statereads
+        self.scens.update(other.scens)
+    #report gives a summary of the profile as text, with the functions by total update time,
+    #the time-steps needing the most passes, and the slowest scenarios
+    def report(self, top=10):
+        lines=['Scenarios: '+str(len(self.scens))+', total time: '+'%.4f' % sum(self.scens.values())+' s']
+        lines.append('Flow reads: '+str(self.flowreads)+', state reads: '+str(self.statereads))
+        lines.append('')
+        lines.append('%-20s %10s %12s %12s' % ('Function', 'Updates', 'Time (s)', 'Per update'))
+        for fxnname, (calls, duration) in sorted(self.fxns.items(), key=lambda item: -item[1][1]):
+            lines.append('%-20s %10d %12.4f %12.2e' % (fxnname, calls, duration, duration/calls))
+        lines.append('')
+        lines.append('%-10s %10s %12s %12s' % ('Time-step', 'Runs', 'Mean passes', 'Max passes'))
+        for time, (runs, passes, maxpasses) in sorted(self.steps.items(), key=lambda item: (-item[1][2], item[0]))[:top]:
+            lines.append('%-10s %10d %12.2f %12d' % (time, runs, passes/runs, maxpasses))
+        lines.append('')
+        lines.append('%-50s %12s' % ('Scenario', 'Time (s)'))
+        for key, duration in sorted(self.scens.items(), key=lambda item: -item[1])[:top]:
+            lines.append('%-50s %12.4f' % (str(key), duration))
+        return '\n'.join(lines)
+
+#PropTrace
+# a trace of the events in the propagation of scenarios, which is recorded when given to 
+# runonefault, and can be written as a Chrome trace-event file (e.g. to open in chrome://tracing
+# or Perfetto). Each scenario is shown as a thread, with an event for each time-step propagated 
+# (with the number of passes it needed and any warning) containing an event for each function 
+# update (with the pass it was in and the flows it changed). Faults are injected in pass 0.
+# usage:
+#   trace=PropTrace()
+#   runonefault(mdl, scen, trace=trace)
+#   trace.write('trace.json')
+class PropTrace(object):
+    def __init__(self):
+        self.events=[]
+        self.origin=perf_counter()
+        self.scen=0
+    #startscen starts the thread of events of a new scenario
+    def startscen(self, name):
+        self.scen+=1
+        self.events.append({'name':'thread_name', 'ph':'M', 'pid':1, 'tid':self.scen, 'args':{'name':name}})
+    #addevent adds an event of a given name and category, from its start (from perf_counter) and duration in seconds
+    def addevent(self, name, cat, start, duration, args):
+        self.events.append({'name':name, 'cat':cat, 'ph':'X', 'ts':(start-self.origin)*1e6, 'dur':duration*1e6, 'pid':1, 'tid':self.scen, 'args':args})
+    #addupdate adds the update of a function in a pass of the propagation of a time-step
+    def addupdate(self, time, passnum, fxnname, flows, start, duration, fault=''):
+        args={'time':time, 'pass':passnum, 'flows changed':list(flows)}
+        if fault:
+            args['fault']=fault
+        self.addevent(fxnname, 'update', start, duration, args)
+    #addstep adds the propagation of a time-step
+    def addstep(self, time, passes, start, duration, warning=None):
+        args={'time':time, 'passes':passes}
+        if warning:
+            args['warning']=warning
+        self.addevent('t='+str(time), 'time-step', start, duration, args)
+    #write writes the trace to a file in the Chrome trace-event format
+    def write(self, filename):
+        with open(filename, 'w') as file:
+            json.dump({'traceEvents':self.events, 'displayTimeUnit':'ms'}, file)
+
+## BATCH SIMULATION
+
+#propbatch
+# runs a list of scenarios together in lockstep, with one pass over the time range for all
+# of the scenarios. Each scenario has its own graph, but the numeric flow states of all the 
+# scenarios are kept in one matrix (one row per scenario, see bindbatch), so that functions
+# with a vectorized form (a batchupdatefxn method, see BatchFxn) are updated in all of the
+# scenarios at once. Other functions are updated in each scenario in turn. Each scenario 
+# joins the batch from the nominal state at the time its fault is injected, and (with 
+# stopearly) leaves it once it is back to nominal (see findsettled).
+# A batch is faster than running the scenarios one at a time when most of the updates are
+# of functions with a vectorized form (see the propbatch benchmark in benchmark.py). If no 
+# function in the model has a vectorized form, a batch would only add the cost of keeping 
+# the matrix, so the scenarios are instead run one at a time (see runonefault).
+# inputs:
+#   - mdl, the model module defined in mdl.py
+#   - scenlist, a list of fault scenarios (e.g. from listinitfaults)
+#   - stopearly, whether to stop simulating each scenario once it is back to nominal (see runonefault)
+#   - profile, a profile to record the propagation of the scenarios in (see PropProfile), if given.
+#     Since the scenarios are run together, each is given an equal share of the time of the batch.
+# outputs:
+#   - allresults, a list of the endresults of each scenario (see runonefault)
+def propbatch(mdl, scenlist, stopearly=True, profile=None):
+    graph=initgraph(mdl)
+    if not any([hasattr(fxn, 'batchupdatefxn') for fxn in getindex(graph)['fxns'].values()]):
+        return [runonefault(mdl, scen, graph=graph, stopearly=stopearly, profile=profile)[0] for scen in scenlist]
+    if not scenlist:
+        return []
+    if profile:
+        batchstart=perf_counter()
+    nomrun=nominalrun(mdl)
+    timerange=mdl.times
+    graphs, matrix=initbatch(mdl, len(scenlist))
+    batchobjs=getbatchobjs(graphs)
+    #the scenarios joining the batch and injecting faults at each time
+    joins={}
+    injecting={}
+    lasttimes=[]
+    for k, scen in enumerate(scenlist):
+        injections=getinjections(scen)
+        time=min(injections, default=scen['properties']['time'])
+        joins.setdefault(nominalcheckpoint(mdl, time)[0], []).append(k)
+        for rtime, faults in injections.items():
+            injecting.setdefault(rtime, {})[k]=faults
+        lasttimes.append(max(injections, default=time))
+    active=np.zeros(len(scenlist), dtype=bool)
+    settled=np.zeros(len(scenlist), dtype=bool)
+    warnings=[[] for scen in scenlist]
+    for rtime in range(timerange[0], timerange[-1]+1):
+        for k in joins.get(rtime, []):
+            setstate(graphs[k], nominalcheckpoint(mdl, rtime)[1])
+            updatefaultmasks(batchobjs, k)
+            active[k]=True
+        injections={k:faults for k, faults in injecting.get(rtime, {}).items() if active[k]}
+        for k, warning in propagatebatch(graphs, matrix, np.flatnonzero(active), injections, rtime, batchobjs, profile).items():
+            warnings[k].append(warning)
+        if stopearly:
+            for k in np.flatnonzero(active):
+                if rtime>=lasttimes[k] and findsettled(mdl, graphs[k], rtime, scenlist[k]['faults']):
+                    active[k]=False
+                    settled[k]=True
+    allresults=[]
+    for k, (scen, graph) in enumerate(zip(scenlist, graphs)):
+        if settled[k]:
+            setstate(graph, nomrun['states'][timerange[-1]])
+        resgraph=makeresultsgraph(graph, nomrun['traj'][timerange[-1]])
+        endflows, endfaults, endclass = classifyresults(mdl,resgraph, scen)
+        allresults.append({'flows': endflows, 'faults': endfaults, 'classification':endclass, 'warnings':warnings[k]})
+    if profile:
+        duration=(perf_counter()-batchstart)/len(scenlist)
+        for scen in scenlist:
+            profile.scens[scen['properties']['function'], scen['properties']['fault'], scen['properties']['time']]=duration
+    return allresults
+
+#propagatebatch
+# propagates faults through a batch of graphs at one time-step (see propagate). Functions are
+# updated in the same order in each scenario as in propagate, but each update is done for 
+# all of the scenarios the function needs to be updated in at once. The passes of each 
+# scenario are counted in an array, and the functions updated and flows changed in each 
+# update are kept in a log, from which the passes of a scenario are only put together 
+# when it needs a warning (see getbatchpasses).
+# inputs:
+#   - graphs, the graphs of the scenarios in the batch (bound to a matrix with bindbatch)
+#   - matrix, the matrix of flow states of the batch
+#   - active, an array of the indices of the scenarios to propagate
+#   - injections, a dictionary {scenario index: faults} of the faults to initiate in each scenario
+#   - time, the time propagation occurs at
+#   - batchobjs, the objects of the graphs (see getbatchobjs)
+#   - profile, a profile to record the updates and passes in (see PropProfile), if given
+# outputs:
+#   - warnings, a dictionary {scenario index: warning} of the warnings from scenarios that did
+#     not converge (see propagate)
+def propagatebatch(graphs, matrix, active, injections, time, batchobjs, profile=None):
+    warnings={}
+    if not len(active):
+        return warnings
+    index=getindex(graphs[0])
+    batchindex=getbatchindex(graphs[0])
+    order=index['order']
+    rank=index['rank']
+    subscribers=index['subscribers']
+    slotflows=batchindex['slotflows']
+    fxnobjs=batchobjs['fxns']
+    flowobjs=batchobjs['flows']
+    #set up history of flows to see if any has changed
+    lasthist=matrix.copy()
+    parthist={flow:{k:getflowstate(flowobjs[flow][k]) for k in active} for flow in batchindex['partflows']}
+    #initialize faults
+    for k, initfaults in injections.items():
+        for fxnname in initfaults:
+            if initfaults[fxnname]!='nom':
+                fxnobjs[fxnname][k].updatefxn(faults=[initfaults[fxnname]], time=time)
+        updatefaultmasks(batchobjs, k, initfaults)
+    #functions to update in each scenario, by rank in the update order
+    activefxns=np.zeros((len(order), len(graphs)), dtype=bool)
+    activefxns[:, active]=True
+    #passes through the update order in each scenario (see propagate), and the log of updates:
+    #(function, scenarios, pass of each scenario, [(flow changed, scenarios it changed in)])
+    numpasses=np.zeros(len(graphs), dtype=int)
+    log=[]
+    seenstates={}
+    lastrank=np.full(len(graphs), len(order))
+    n=0
+    while True:
+        pending=np.flatnonzero(activefxns.any(axis=1))
+        if not len(pending):
+            break
+        fxnrank=pending[0]
+        fxnname=order[fxnrank]
+        idx=np.flatnonzero(activefxns[fxnrank])
+        #a new pass starts in the scenarios where the update order wraps around, and their
+        #states are checked for oscillation once they have had more passes than functions
+        wrapped=idx[fxnrank<lastrank[idx]]
+        for k in wrapped[numpasses[wrapped]>=len(order)]:
+            faults=[fxnobjs[fxn][k].faults for fxn in order]
+            partstates=[getflowstate(flowobjs[flow][k]) for flow in batchindex['partflows']]
+            statekey=hashablestate((matrix[k], partstates, lasthist[k], [parthist[flow][k] for flow in batchindex['partflows']], activefxns[:, k], faults))
+            seen=seenstates.setdefault(k, {})
+            if statekey in seen:
+                warnings[k]=makepropwarning('oscillation', time, getbatchpasses(log, k, numpasses[k])[seen[statekey]:])
+                activefxns[:, k]=False
+            else:
+                seen[statekey]=numpasses[k]
+        numpasses[wrapped]+=1
+        if len(warnings):
+            idx=np.flatnonzero(activefxns[fxnrank])
+            if not len(idx):
+                continue
+        lastrank[idx]=fxnrank
+        activefxns[fxnrank, idx]=False
+        if profile:
+            start=perf_counter()
+        if fxnname in batchobjs['batchfxns']:
+            batchfxn=getbatchfxn(fxnname, batchobjs, matrix, idx)
+            type(batchfxn.fxns[0]).batchupdatefxn(batchfxn, time=time)
+        else:
+            for k in idx:
+                fxnobjs[fxnname][k].updatefxn(time=time)
+        if profile:
+            profile.addcall(fxnname, perf_counter()-start, calls=len(idx))
+            profile.flowreads+=len(index['fxnflows'][fxnname])*len(idx)
+        changedflows=[]
+        #flows in the matrix are compared for all of the scenarios at once
+        slots=batchindex['fxnslots'][fxnname]
+        if len(slots):
+            states=matrix[np.ix_(idx, slots)]
+            changed=states!=lasthist[np.ix_(idx, slots)]
+            lasthist[np.ix_(idx, slots)]=states
+            for col in np.flatnonzero(changed.any(axis=0)):
+                flow=slotflows[slots[col]]
+                changedidx=idx[changed[:, col]]
+                changedflows.append((flow, changedidx))
+                for subfxn in subscribers[flow]:
+                    activefxns[rank[subfxn], changedidx]=True
+        for flow in batchindex['fxnpartflows'][fxnname]:
+            changedidx=[]
+            for k in idx:
+                state=getflowstate(flowobjs[flow][k])
+                if state!=parthist[flow][k]:
+                    parthist[flow][k]=state
+                    changedidx.append(k)
+            if profile:
+                profile.statereads+=len(idx)
+            if changedidx:
+                changedflows.append((flow, np.array(changedidx)))
+                for subfxn in subscribers[flow]:
+                    activefxns[rank[subfxn], changedidx]=True
+        log.append((fxnname, idx, numpasses[idx], changedflows))
+        n+=1
+        if n>1000*len(order):
+            for k in np.flatnonzero(activefxns.any(axis=0)):
+                warnings[k]=makepropwarning('nonconvergence', time, getbatchpasses(log, k, numpasses[k])[-1:], numpasses=numpasses[k])
+            break
+    if profile:
+        for k in active:
+            profile.addstep(time, numpasses[k])
+    return warnings
+
+#getbatchpasses
+# puts together the passes of a scenario in the propagation of a batch (see propagatebatch) 
+# from the log of updates, in the form of the passes in propagate
+# inputs: log, the log of updates, k, the index of the scenario, and numpasses, its number of passes
+# outputs: passes, a list of the functions updated and flows changed in each pass {functions:[], flows:[]}
+def getbatchpasses(log, k, numpasses):
+    passes=[{'functions':[], 'flows':[]} for i in range(numpasses)]
+    for fxnname, idx, passnums, changedflows in log:
+        pos=np.searchsorted(idx, k)
+        if pos<len(idx) and idx[pos]==k:
+            proppass=passes[passnums[pos]-1]
+            proppass['functions'].append(fxnname)
+            proppass['flows'].extend([flow for flow, changedidx in changedflows if k in changedidx])
+    return passes
+
+#initbatch
+# initializes the graphs of a batch of scenarios, bound to the rows of one matrix (see bindbatch).
+# The index (see getindex) and state vector layout (see bindstatevector) are the same for 
+# every graph of a model, so they are only found for the first graph, and the objects of each 
+# other graph are put in their place (see copyindex).
+# inputs: mdl, the model module defined in mdl.py, and num, the number of graphs
+# outputs: graphs, the graphs of the batch, and matrix, the matrix of flow states of the batch
+def initbatch(mdl, num):
+    template=initgraph(mdl)
+    if 'statevector' not in template.graph:
+        bindstatevector(template)
+    getbatchindex(template)
+    graphs=[template]+[copyindex(mdl.initialize(), template) for k in range(num-1)]
+    return graphs, bindbatch(graphs)
+
+#copyindex
+# indexes a graph of a model and binds it to a state vector (see initgraph and bindstatevector) 
+# in the same way as another graph of the same model, without finding its structure again
+# inputs: g, the graph to index, and template, an indexed graph of the model bound to a state vector
+# outputs: g, the graph
+def copyindex(g, template):
+    tindex=getindex(template)
+    statevector=template.graph['statevector']
+    index=dict(tindex)
+    index['fxns']={fxnname:g.nodes[fxnname]['obj'] for fxnname in g.nodes}
+    index['flows']={flow:g.edges[big, end][flow] for big, end in g.edges for flow in g.edges[big, end]}
+    #graphs which are not made in the same way as the template are indexed from scratch
+    if list(index['fxns'])!=list(tindex['fxns']) or list(index['flows'])!=list(tindex['flows']):
+        getindex(g)
+        bindstatevector(g)
+        return g
+    vector=np.array([getattr(index['flows'][flow], var) for flow, var in statevector['layout']], dtype=float)
+    for flow, flowobj in index['flows'].items():
+        tflowobj=tindex['flows'][flow]
+        vecslots=getattr(tflowobj, 'vecslots', {})
+        if vecslots:
+            for var in vecslots:
+                getattr(flowobj, '__dict__', {}).pop(var, None)
+            object.__setattr__(flowobj, 'statevector', vector)
+            object.__setattr__(flowobj, 'vecslots', vecslots)
+            flowobj.__class__=type(tflowobj)
+    g.graph['statevector']={'vector':vector, 'layout':statevector['layout'], 'partflows':statevector['partflows']}
+    objs=list(index['fxns'].values())+list(index['flows'].values())
+    if 'childattrs' not in template.graph:
+        template.graph['childattrs']=findchildattrs(tindex['stateobjs'], list(tindex['fxns'].values())+list(tindex['flows'].values()))
+    index['stateobjs']=copystateobjs(tindex['stateobjs'], template.graph['childattrs'], objs)
+    if index['stateobjs'] is None:
+        index['stateobjs']=findstateobjs(objs)
+    g.graph['index']=index
+    if 'batchindex' in template.graph:
+        g.graph['batchindex']=template.graph['batchindex']
+    return g
+
+#copystateobjs
+# finds the objects with state in a model (see findstateobjs) given the objects with state in
+# another graph of the same model, by following the same attributes to the same components. 
+# The structural attributes and slots of each object are those of the object it matches.
+# inputs: stateobjs, the objects with state in the other graph (see findstateobjs), childattrs,
+#         the attributes of each of them leading to components (see findchildattrs), and objs,
+#         the function and flow objects of the graph, in the same order as in the other graph
+# outputs: stateobjs, the objects with state in the graph, or None if they do not match
+def copystateobjs(stateobjs, childattrs, objs):
+    newstateobjs=[]
+    found=set()
+    objs=list(objs)
+    for (obj, structattrs, slots), attrs in zip(stateobjs, childattrs):
+        while objs and id(objs[0]) in found:
+            objs.pop(0)
+        if not objs or type(objs[0]) is not type(obj):
+            return None
+        newobj=objs.pop(0)
+        found.add(id(newobj))
+        for attr in attrs:
+            objs.extend(findmodelobjs(getattr(newobj, attr, None)))
+        newstateobjs.append((newobj, structattrs, slots))
+    return newstateobjs
+
+#findchildattrs
+# finds the attributes of the objects with state in a graph which lead to components not
+# found through earlier objects (in the order of findstateobjs), for copystateobjs
+# inputs: stateobjs, the objects with state in the graph (see findstateobjs), and objs, 
+#         the function and flow objects of the graph
+# outputs: childattrs, a list of the attributes of each object leading to components
+def findchildattrs(stateobjs, objs):
+    childattrs=[]
+    queued=set([id(obj) for obj in objs])
+    for obj, structattrs, slots in stateobjs:
+        attrs=[]
+        for attr in list(getattr(obj, '__dict__', {}))+getslots(type(obj)):
+            if attr in structattrs and attr not in basestructattrs and attr not in getattr(obj, 'vecslots', {}) and hasattr(obj, attr):
+                children=[child for child in findmodelobjs(getattr(obj, attr)) if id(child) not in queued]
+                if children:
+                    attrs.append(attr)
+                    queued.update([id(child) for child in children])
+        childattrs.append(attrs)
+    return childattrs
+
+#getbatchobjs
+# gets the objects of the graphs of a batch used by propagatebatch, so they are not looked up
+# in each graph at each update
+# inputs: graphs, the graphs of the batch
+# outputs: batchobjs, a dictionary with structure 
+#   {fxns:{function:[objects]}, flows:{flow:[objects]}, batchfxns:{function:{attribute:flow or [flows]}},
+#    faultmasks:{function:{mode:array}}}
+#   with the object in each graph of each function and flow, the attributes holding flows of 
+#   the functions with a vectorized form (see BatchFxn), and whether each of their fault modes 
+#   is present in each graph (kept up to date with updatefaultmasks)
+def getbatchobjs(graphs):
+    indexes=[getindex(g) for g in graphs]
+    batchobjs={'fxns':{}, 'flows':{}, 'batchfxns':{}, 'faultmasks':{}}
+    for fxnname, fxn in indexes[0]['fxns'].items():
+        batchobjs['fxns'][fxnname]=[index['fxns'][fxnname] for index in indexes]
+    for flow in indexes[0]['flows']:
+        batchobjs['flows'][flow]=[index['flows'][flow] for index in indexes]
+    flownames={id(flowobj):flow for flow, flowobj in indexes[0]['flows'].items()}
+    for fxnname, fxn in indexes[0]['fxns'].items():
+        if not hasattr(fxn, 'batchupdatefxn'):
+            continue
+        flowattrs={}
+        for attr, value in vars(fxn).items():
+            if id(value) in flownames:
+                flowattrs[attr]=flownames[id(value)]
+            elif type(value) in (list, tuple) and value and all([id(val) in flownames for val in value]):
+                flowattrs[attr]=[flownames[id(val)] for val in value]
+        batchobjs['batchfxns'][fxnname]=flowattrs
+        batchobjs['faultmasks'][fxnname]={mode:np.zeros(len(graphs), dtype=bool) for mode in fxn.faultmodes}
+    for k in range(len(graphs)):
+        updatefaultmasks(batchobjs, k)
+    return batchobjs
+
+#updatefaultmasks
+# updates the masks of the fault modes of the functions with a vectorized form in a graph of 
+# a batch (see getbatchobjs), e.g. after its state has been set or faults have been injected
+# inputs: batchobjs, the objects of the batch, k, the index of the graph, and fxnnames,
+#         the functions to update the masks of (all of them, if not given)
+def updatefaultmasks(batchobjs, k, fxnnames=None):
+    if fxnnames is None:
+        fxnnames=batchobjs['faultmasks']
+    for fxnname in fxnnames:
+        if fxnname in batchobjs['faultmasks']:
+            faults=batchobjs['fxns'][fxnname][k].faults
+            for mode, mask in batchobjs['faultmasks'][fxnname].items():
+                mask[k]=mode in faults
+
+#getbatchfxn
+# gets the view of a function across some of the scenarios of a batch (see BatchFxn)
+# inputs: fxnname, the name of the function, batchobjs, the objects of the batch (see getbatchobjs),
+#         matrix, the matrix of flow states of the batch, and idx, an array of the indices of the scenarios
+# outputs: batchfxn, the view of the function
+def getbatchfxn(fxnname, batchobjs, matrix, idx):
+    fxnobjs=batchobjs['fxns'][fxnname]
+    flows={}
+    for attr, flow in batchobjs['batchfxns'][fxnname].items():
+        if type(flow) is list:
+            flows[attr]=[BatchFlow(batchobjs['flows'][name], matrix, idx) for name in flow]
+        else:
+            flows[attr]=BatchFlow(batchobjs['flows'][flow], matrix, idx)
+    return BatchFxn([fxnobjs[k] for k in idx], flows, batchobjs['faultmasks'][fxnname], idx)
+
+#bindbatch
+# binds the state vectors of a list of graphs of the same model to the rows of one matrix
+# inputs: graphs, a list of graphs of the model
+# outputs: matrix, an array with the state vector of each graph as a row
+def bindbatch(graphs):
+    for g in graphs:
+        if 'statevector' not in g.graph:
+            bindstatevector(g)
+    matrix=np.array([g.graph['statevector']['vector'] for g in graphs])
+    for k, g in enumerate(graphs):
+        g.graph['statevector']['vector']=matrix[k]
+        for flowobj in getindex(g)['flows'].values():
+            if getattr(flowobj, 'vecslots', {}):
+                object.__setattr__(flowobj, 'statevector', matrix[k])
+    return matrix
+
+#getbatchindex
+# gets the index of the state vector slots of the flows of each function used by propagatebatch
+# inputs: g, a graph of the model bound to a state vector
+# outputs: batchindex, a dictionary with structure 
+#   {fxnslots:{function:array of slots}, slotflows:array of the flow in each slot,
+#    partflows:[flows], fxnpartflows:{function:[flows]}}
+#   where partflows are the flows with states not covered by the state vector
+def getbatchindex(g):
+    if 'batchindex' not in g.graph:
+        index=getindex(g)
+        statevector=g.graph['statevector']
+        slotflows=statevector['layout'][:, 0]
+        partflows=statevector['partflows']
+        batchindex={'fxnslots':{}, 'slotflows':slotflows, 'partflows':partflows, 'fxnpartflows':{}}
+        for fxnname, flows in index['fxnflows'].items():
+            batchindex['fxnslots'][fxnname]=np.flatnonzero(np.isin(slotflows, flows))
+            batchindex['fxnpartflows'][fxnname]=[flow for flow in flows if flow in partflows]
+        g.graph['batchindex']=batchindex
+    return g.graph['batchindex']
+
+#BatchFxn
+# a view of a function across the scenarios in a batch, given to the batchupdatefxn method
+# of functions which have one in place of the function itself. In a batchupdatefxn:
+#   - flows of the function are BatchFlows, where each state is an array with one value per scenario
+#   - other attributes are gathered into arrays from each scenario (and set in each when assigned)
+#   - lists of flows of the function are lists of BatchFlows
+#   - hasfault(mode) gives an array of whether each scenario has the fault mode (which for 
+#     the modes of the function is kept as a mask over the batch, see getbatchobjs)
+#   - addfault(mode, mask) adds the fault mode in the scenarios where mask is True
+#   - other methods of the function can be called, with the BatchFxn as self
+#   - fxns is the list of the function in each scenario (e.g. for attributes which are the 
+#     same in every scenario, such as fxns[0].faultmodes)
+# BatchFxns are made with getbatchfxn.
+class BatchFxn(object):
+    __slots__=('fxns', 'flows', 'faultmasks', 'idx')
+    def __init__(self, fxns, flows, faultmasks, idx):
+        object.__setattr__(self, 'fxns', fxns)
+        object.__setattr__(self, 'flows', flows)
+        object.__setattr__(self, 'faultmasks', faultmasks)
+        object.__setattr__(self, 'idx', idx)
+    def __getattr__(self, name):
+        if name in self.flows:
+            return self.flows[name]
+        method=getattr(type(self.fxns[0]), name, None)
+        if callable(method):
+            return types.MethodType(method, self)
+        return np.array([getattr(fxn, name) for fxn in self.fxns])
+    def __setattr__(self, name, value):
+        values=np.broadcast_to(value, (len(self.fxns),)).tolist()
+        for fxn, val in zip(self.fxns, values):
+            setattr(fxn, name, val)
+    def hasfault(self, mode):
+        if mode in self.faultmasks:
+            return self.faultmasks[mode][self.idx]
+        return np.array([mode in fxn.faults for fxn in self.fxns])
+    def addfault(self, mode, mask=True):
+        mask=np.broadcast_to(mask, (len(self.fxns),))
+        for fxn, add in zip(self.fxns, mask):
+            if add:
+                fxn.faults.add(mode)
+        if mode in self.faultmasks:
+            self.faultmasks[mode][self.idx[mask]]=True
+
+#BatchFlow
+# a view of a flow across the scenarios idx of a batch, given the flow object in every scenario 
+# of the batch. States in the state vector are columns of the batch matrix, other states are 
+# gathered into arrays from (and set in) each scenario.
+class BatchFlow(object):
+    __slots__=('flowobjs', 'matrix', 'idx', 'vecslots')
+    def __init__(self, flowobjs, matrix, idx):
+        object.__setattr__(self, 'flowobjs', flowobjs)
+        object.__setattr__(self, 'matrix', matrix)
+        object.__setattr__(self, 'idx', idx)
+        object.__setattr__(self, 'vecslots', getattr(flowobjs[0], 'vecslots', {}))
+    def __getattr__(self, name):
+        if name in self.vecslots:
+            return self.matrix[self.idx, self.vecslots[name]]
+        return np.array([getattr(self.flowobjs[k], name) for k in self.idx])
+    def __setattr__(self, name, value):
+        if name in self.vecslots:
+            self.matrix[self.idx, self.vecslots[name]]=value
+        else:
+            values=np.broadcast_to(value, (len(self.idx),)).tolist()
+            for k, val in zip(self.idx, values):
+                setattr(self.flowobjs[k], name, val)
+
+## FLOW DEFINITION
+
+#Flow
+# a base class for the flows in a model. Subclasses declare the attributes making up the
+# state of the flow in statevars (and in __slots__, to keep the flow compact), and may give
+# them different names to display in status() with statenames. Setting a state to a new
+# value increments the version of the flow, so propagate can detect changes by comparing
+# version numbers instead of building and comparing status() dicts.
+# Note: subclasses must call super().__init__() before setting any states, and states
+# must be assigned (rather than changed in place, e.g. traj[0]=1) for changes to be seen.
+# Numeric states may be kept in a state vector for the model instead (see bindstatevector).
+class Flow(object):
+    __slots__=('version', 'statevector', 'vecslots')
+    statevars=()
+    statenames=()
+    def __init__(self):
+        object.__setattr__(self, 'version', 0)
+    def __setattr__(self, name, value):
+        if name in self.statevars:
+            oldvalue=getattr(self, name, unset)
+            if oldvalue is unset or oldvalue!=value:
+                object.__setattr__(self, 'version', self.version+1)
+        object.__setattr__(self, name, value)
+    #state gives the values of the states as a tuple, e.g. for comparison with another flow
+    def state(self):
+        return tuple([getattr(self, var) for var in self.statevars])
+    #status gives the values of the states in a dict for display in results
+    def status(self):
+        return dict(zip(self.statenames or self.statevars, self.state()))
+
+#unset
+# a placeholder for states which have not been set yet
+unset=object()
+
+#getflowtoken
+# gets a value which changes whenever the state of a flow is set: the version number of
+# flows based on Flow, otherwise the status of the flow. Note that a flow set to a new 
+# value and back has a new version, so the state of the flow must then be checked with getflowstate
+def getflowtoken(flowobj):
+    if isinstance(flowobj, Flow):
+        return flowobj.version
+    else:
+        return flowobj.status()
+
+#getflowstate
+# gets the state of a flow for comparison: the tuple of states of flows based on Flow, 
+# otherwise the status of the flow
+def getflowstate(flowobj):
+    if isinstance(flowobj, Flow):
+        return flowobj.state()
+    else:
+        return flowobj.status()
+
+#bindstatevector
+# moves the numeric states of the flows in the graph g (which are based on Flow) into a
+# single NumPy state vector for the model, making the flows views onto their slots in the 
+# vector. Capturing the state of the model then copies one array, and flows can be compared 
+# with a nominal model in one operation. Other states (e.g. lists or strings) stay in the flows.
+# Note: states in the vector can only be set to numbers.
+# inputs: g, the graph object of the model
+# outputs: statevector, a dictionary with structure 
+#   {vector: array, layout: array of [flow, attribute] for each slot, partflows: [flows]}
+#   where partflows are the flows with states (or a status) not covered by the vector.
+#   It is also kept in the graph attributes as g.graph['statevector']
+def bindstatevector(g):
+    index=getindex(g)
+    layout=[]
+    values=[]
+    partflows=[]
+    for flow, flowobj in index['flows'].items():
+        if isinstance(flowobj, Flow):
+            vecvars=[var for var in flowobj.statevars if isnumeric(getattr(flowobj, var))]
+            layout.extend([[flow, var] for var in vecvars])
+            values.extend([getattr(flowobj, var) for var in vecvars])
+        else:
+            vecvars=[]
+        if len(vecvars)<len(getattr(flowobj, 'statevars', [])) or not hasdefaultstatus(flowobj):
+            partflows.append(flow)
+    vector=np.array(values, dtype=float)
+    for flow, flowobj in index['flows'].items():
+        vecslots={var:i for i, (vecflow, var) in enumerate(layout) if vecflow==flow}
+        if vecslots:
+            for var in vecslots:
+                getattr(flowobj, '__dict__', {}).pop(var, None)
+            object.__setattr__(flowobj, 'statevector', vector)
+            object.__setattr__(flowobj, 'vecslots', vecslots)
+            flowobj.__class__=getviewclass(type(flowobj), tuple(vecslots))
+    statevector={'vector':vector, 'layout':np.array(layout, dtype=object).reshape(-1,2), 'partflows':partflows}
+    g.graph['statevector']=statevector
+    #states in the vector are no longer captured individually
+    index['stateobjs']=findstateobjs([obj for obj, structattrs, slots in index['stateobjs']])
+    return statevector
+
+#viewclasses
+# the classes of flows made into views onto a state vector, by flow class and attributes
+viewclasses={}
+
+#getviewclass
+# gets a subclass of a flow class in which the given attributes are kept in a state vector
+def getviewclass(flowclass, vecvars):
+    if (flowclass, vecvars) not in viewclasses:
+        namespace={'__slots__':(), '__module__':flowclass.__module__}
+        for var in vecvars:
+            namespace[var]=vectorproperty(var)
+        viewclasses[flowclass, vecvars]=type(flowclass.__name__, (flowclass,), namespace)
+    return viewclasses[flowclass, vecvars]
+
+#vectorproperty
+# makes a property which gets and sets an attribute of a flow in its slot in the state vector
+def vectorproperty(var):
+    def getvar(flowobj):
+        return flowobj.statevector.item(flowobj.vecslots[var])
+    def setvar(flowobj, value):
+        flowobj.statevector[flowobj.vecslots[var]]=value
+    return property(getvar, setvar)
+
+#isnumeric
+# checks whether a value is a number which can be kept in a state vector
+def isnumeric(value):
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+#hasdefaultstatus
+# checks whether the status of a flow is given by its states (as in Flow)
+def hasdefaultstatus(flowobj):
+    return isinstance(flowobj, Flow) and type(flowobj).status is Flow.status
+
+## MODEL STATE
+
+#getstate
+# captures the state of the model in the graph g: the attributes of each flow, the fault
+# sets and internal states (e.g. timers) of each function, and the states of any 
+# components in the functions. The state is not changed by further propagation of g.
+# inputs: g, the graph object of the model
+# outputs: state, a tuple (vector, objstates) of a copy of the state vector of the model (or 
+#          None if it has none, see bindstatevector) and a tuple with a dict of the data 
+#          attributes of each object in the model, in the order of the objects in the graph index
+def getstate(g):
+    if 'statevector' in g.graph:
+        vector=g.graph['statevector']['vector'].copy()
+    else:
+        vector=None
+    objstates=[]
+    for obj, structattrs, slots in getindex(g)['stateobjs']:
+        objstate={}
+        for attr, value in getattr(obj, '__dict__', {}).items():
+            if attr not in structattrs:
+                objstate[attr]=copydata(value)
+        for attr in slots:
+            if hasattr(obj, attr):
+                objstate[attr]=copydata(getattr(obj, attr))
+        objstates.append(objstate)
+    return vector, tuple(objstates)
+
+#setstate
+# restores the state of the model in the graph g in place, so the graph does not have
+# to be re-initialized. The state can be restored any number of times.
+# inputs: 
+#   - g, the graph object of the model
+#   - state, the state of the model captured with getstate (from g or another graph of the same model)
+def setstate(g, state):
+    vector, objstates=state
+    if vector is not None:
+        g.graph['statevector']['vector'][:]=vector
+    for (obj, structattrs, slots), objstate in zip(getindex(g)['stateobjs'], objstates):
+        attrs=getattr(obj, '__dict__', {})
+        #attributes set after the state was captured are removed
+        for attr in [attr for attr in attrs if attr not in structattrs and attr not in objstate]:
+            del attrs[attr]
+        for attr, value in objstate.items():
+            #(states captured before the state vector was bound are set in the vector)
+            if attr in slots or attr in getattr(obj, 'vecslots', {}):
+                setattr(obj, attr, copydata(value))
+            else:
+                attrs[attr]=copydata(value)
+        if isinstance(obj, Flow):
+            object.__setattr__(obj, 'version', obj.version+1)
+
+#samestate
+# checks whether two states of the model captured with getstate are the same
+def samestate(state1, state2):
+    vector1, objstates1=state1
+    vector2, objstates2=state2
+    if vector1 is not None and not np.array_equal(vector1, vector2):
+        return False
+    try:
+        return objstates1==objstates2
+    except ValueError:
+        #(arrays held in the state cannot be compared as a whole, so it is not taken as the same)
+        return False
+
+#findstateobjs
+# finds the objects with state in the model: the given functions and flows, as well as any
+# components they hold (e.g. the lines in an affectDOF function). Attributes holding other
+# objects (e.g. the flows of a function), the fault mode definitions, the versions of flows,
+# and states kept in the model state vector are structural and are not part of the state.
+# inputs: objs, a list of the function and flow objects in the model
+# outputs: stateobjs, a list of tuples (obj, structattrs, slots) of each object with the set 
+#          of its structural attributes and the list of its state attributes kept in __slots__
+def findstateobjs(objs):
+    stateobjs=[]
+    found=set()
+    objs=list(objs)
+    while objs:
+        obj=objs.pop(0)
+        if id(obj) in found:
+            continue
+        found.add(id(obj))
+        structattrs=set(basestructattrs)
+        #states kept in the model state vector are captured with the vector
+        structattrs.update(getattr(obj, 'vecslots', {}))
+        slots=getslots(type(obj))
+        attrs=dict(getattr(obj, '__dict__', {}))
+        attrs.update({slot:getattr(obj, slot) for slot in slots if hasattr(obj, slot)})
+        for attr, value in attrs.items():
+            if attr in structattrs:
+                continue
+            elif not isdata(value):
+                structattrs.add(attr)
+                objs.extend(findmodelobjs(value))
+        slots=[slot for slot in slots if slot not in structattrs]
+        stateobjs.append((obj, structattrs, slots))
+    return stateobjs
+
+#basestructattrs
+# the attributes of model objects which are always structural (see findstateobjs)
+basestructattrs=('faultmodes', 'version', 'statevector', 'vecslots')
+
+#slotsbyclass
+# the attributes kept in __slots__ by each class, found by getslots
+slotsbyclass={}
+
+#getslots
+# gets the attributes kept in __slots__ by a class (and its base classes)
+def getslots(cls):
+    if cls not in slotsbyclass:
+        slots=[]
+        for base in cls.__mro__:
+            clsslots=base.__dict__.get('__slots__', ())
+            if isinstance(clsslots, str):
+                clsslots=(clsslots,)
+            slots.extend([slot for slot in clsslots if slot not in ('__dict__', '__weakref__')])
+        slotsbyclass[cls]=slots
+    return list(slotsbyclass[cls])
+
+#findmodelobjs
+# finds the objects (e.g. components) in an attribute value, including inside lists, tuples, and dicts
+def findmodelobjs(value):
+    if type(value) in (list, tuple):
+        return [obj for val in value for obj in findmodelobjs(val)]
+    elif type(value) is dict:
+        return [obj for val in value.values() for obj in findmodelobjs(val)]
+    elif isinstance(value, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+        return []
+    elif hasattr(value, '__dict__') or hasattr(type(value), '__slots__'):
+        return [value]
+    else:
+        return []
+
+#datatypes
+# the types of values which are data in the model state (see isdata)
+datatypes=(int, float, complex, bool, str, bytes, type(None), np.number, np.bool_, np.ndarray)
+
+#isdata
+# checks whether a value is data (numbers, strings, arrays, and containers of them)
+def isdata(value):
+    if isinstance(value, datatypes):
+        return True
+    elif type(value) in (list, tuple, set, frozenset):
+        return all(isdata(val) for val in value)
+    elif type(value) is dict:
+        return all(isdata(val) for val in value.values())
+    else:
+        return False
+
+#copydata
+# copies a data value so that it is not changed by changes to the original (immutable values are not copied)
+def copydata(value):
+    valtype=type(value)
+    if valtype is list:
+        return [copydata(val) for val in value]
+    elif valtype is set:
+        return set(value)
+    elif valtype is dict:
+        return {key:copydata(val) for key, val in value.items()}
+    elif valtype is tuple:
+        return tuple([copydata(val) for val in value])
+    elif valtype is np.ndarray:
+        return value.copy()
+    else:
+        return value
+
 #USEFUL MISC FUNCTIONS
 
 #listfaultsprops
@@ -470,29 +2578,85 @@ def findfault(fxnname, g):
         if faults.issuperset({'nominal'}):
             faults.remove('nominal')
     return faults
+#initgraph
+# initializes the model graph and builds its index (see getindex). Models which set 
+# statevector=True (like times) have their flows bound to a state vector (see bindstatevector)
+# inputs: mdl, the model module defined in mdl.py
+# outputs: g, the graph object of the model
+def initgraph(mdl):
+    g=mdl.initialize()
+    getindex(g)
+    if getattr(mdl, 'statevector', False):
+        bindstatevector(g)
+    return g
+
+#getindex
+# gets the index of the functions and flows in the model graph used for lookups and by
+# propagate. The index is built once (by initgraph, or the first time it is needed) and
+# stored in the graph attributes, so it is carried into copies such as results graphs
+# inputs: g, the graph object of the model
+# outputs: index, a dictionary with structure:
+#   {fxns:{function:obj}, flows:{flow:obj}, fxnflows:{function:[flows]}, 
+#    subscribers:{flow:[functions]}, components:[[functions]], component:{function:position in components},
+#    order:[functions], rank:{function:position in order}, stateobjs:[(obj, structural attributes, slots)]}
+#   where fxnflows are the flows on the edges in and out of each function, subscribers 
+#   are the functions on the edges each flow is on, components are the strongly connected 
+#   components of the graph in update order (see findcomponents), and stateobjs are the 
+#   objects with state in the model (see findstateobjs)
+def getindex(g):
+    if 'index' not in g.graph:
+        index={'fxns':{}, 'flows':{}, 'fxnflows':{}, 'subscribers':{}}
+        for fxnname in g.nodes:
+            index['fxns'][fxnname]=g.nodes[fxnname]['obj']
+            index['fxnflows'][fxnname]=[]
+        for big, end in g.edges:
+            for flow in g.edges[big, end]:
+                flowobj=g.edges[big, end][flow]
+                #results graphs keep the flow object with the results
+                if type(flowobj) is dict:
+                    flowobj=flowobj['obj']
+                index['flows'][flow]=flowobj
+                subscribers=index['subscribers'].setdefault(flow, [])
+                for fxnname in [big, end]:
+                    if fxnname not in subscribers:
+                        subscribers.append(fxnname)
+                    if flow not in index['fxnflows'][fxnname]:
+                        index['fxnflows'][fxnname].append(flow)
+        index['components']=findcomponents(g)
+        index['component']={fxnname:i for i, component in enumerate(index['components']) for fxnname in component}
+        index['order']=[fxnname for component in index['components'] for fxnname in component]
+        index['rank']={fxnname:i for i, fxnname in enumerate(index['order'])}
+        index['stateobjs']=findstateobjs(list(index['fxns'].values())+list(index['flows'].values()))
+        g.graph['index']=index
+    return g.graph['index']
+
+#findcomponents
+# finds the order functions are updated in by propagate, using the strongly connected
+# components of the graph (i.e., the feedback loops in the model). Components are ordered
+# upstream-first (a topological order of the condensation of the graph), so functions
+# outside of feedback loops only need to be updated again if a downstream function changes
+# one of their flows. Ties are broken by the order functions were added to the graph.
+# inputs: g, the graph object of the model
+# outputs: components, a list of the components in update order, each a list of functions
+def findcomponents(g):
+    position={fxnname:i for i, fxnname in enumerate(g.nodes)}
+    condensed=nx.condensation(g)
+    members=nx.get_node_attributes(condensed, 'members')
+    componentorder=nx.lexicographical_topological_sort(condensed, key=lambda c: min([position[fxnname] for fxnname in members[c]]))
+    return [sorted(members[c], key=position.get) for c in componentorder]
+
 #getfxn
 # gets the function object fxn in the model graph with the name fxnname
 def getfxn(fxnname, graph):
-    fxn=graph.nodes(data='obj')[fxnname]
-    return fxn
+    fxns=getindex(graph)['fxns']
+    if fxnname not in fxns:
+        raise KeyError('No function named '+str(fxnname)+' in the model graph')
+    return fxns[fxnname]
 
 #getflow
 # gets the flow object flowobj in the model graph g with the name flowname
 def getflow(flowname, g):
-    for edge in g.edges:
-        flows=g.get_edge_data(edge[0],edge[1])
-        #flows=list(g.get_edge_data(edge[0],edge[1]).keys())
-        for flow in flows:
-            if flow==flowname:
-                if type(flows[flow]) is dict:
-                    flowobj=flows[flow]['obj']
-                else:
-                    flowobj=flows[flow]
-    return flowobj
-
-
-
-    
-    
-    
-    
+    flows=getindex(g)['flows']
+    if flowname not in flows:
+        raise KeyError('No flow named '+str(flowname)+' in the model graph')
+    return flows[flowname]
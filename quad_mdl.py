@@ -14,48 +14,53 @@ import faultprop as fp
 
 #Declare time range to run model over
 times=[0,3, 55]
+#Keep the numeric states of the flows in a single state vector (see faultprop.bindstatevector)
+statevector=True
 
 ##Define flows for model
-class EE:
+class EE(fp.Flow):
+    __slots__=('rate', 'effort')
+    statevars=('rate', 'effort')
     def __init__(self,name):
+        super().__init__()
         self.rate=1.0
         self.effort=1.0
-    def status(self):
-        status={'rate':self.rate, 'effort':self.effort}
-        return status.copy()
     
-class Force:
+class Force(fp.Flow):
+    __slots__=('flowtype', 'name', 'value')
+    statevars=('value',)
     def __init__(self,name):
+        super().__init__()
         self.flowtype='Force'
         self.name=name
         self.value=1.0
-    def status(self):
-        status={'value':self.value}
-        return status.copy()
 
-class ME:
+class ME(fp.Flow):
+    __slots__=('flowtype', 'name', 'rate', 'effort', 'nominal')
+    statevars=('rate', 'effort')
     def __init__(self,name):
+        super().__init__()
         self.flowtype='ME'
         self.name=name
         self.rate=1.0
         self.effort=1.0
         self.nominal={'rate':1.0, 'effort':1.0}
-    def status(self):
-        status={'rate':self.rate, 'effort':self.effort}
-        return status.copy() 
 
-class Sig:
+class Sig(fp.Flow):
+    __slots__=('flowtype', 'name', 'forward', 'upward')
+    statevars=('forward', 'upward')
     def __init__(self,name):
+        super().__init__()
         self.flowtype='Sig'
         self.name=name
         self.forward=0.0
         self.upward=0.0
-    def status(self):
-        status={'forward':self.forward, 'upward':self.upward}
-        return status.copy() 
 
-class DOF:
+class DOF(fp.Flow):
+    __slots__=('flowtype', 'name', 'stab', 'vertvel', 'planvel', 'uppwr', 'planpwr')
+    statevars=('stab', 'vertvel', 'planvel', 'planpwr', 'uppwr')
     def __init__(self,name):
+        super().__init__()
         self.flowtype='DOF'
         self.name=name
         self.stab=1.0
@@ -63,22 +68,24 @@ class DOF:
         self.planvel=0.0
         self.uppwr=0.0
         self.planpwr=0.0
-    def status(self):
-        status={'stab':self.stab, 'vertvel':self.vertvel, 'planvel':self.planvel, 'planpwr':self.planpwr, 'uppwr':self.uppwr}
-        return status.copy() 
-class Land:
+
+class Land(fp.Flow):
+    __slots__=('flowtype', 'name', 'stat', 'area', 'nominal')
+    statevars=('stat', 'area')
+    statenames=('status', 'area')
     def __init__(self,name):
+        super().__init__()
         self.flowtype='Land'
         self.name=name
         self.stat='landed'
         self.area='start'
         self.nominal={'status':'landed', 'area':'start'}
-    def status(self):
-        status={'status':self.stat, 'area':self.area}
-        return status.copy() 
 
-class Env:
+#Env keeps its areas as regular (non-slot) attributes
+class Env(fp.Flow):
+    statevars=('elev', 'x', 'y')
     def __init__(self,name):
+        super().__init__()
         self.flowtype='Env'
         self.name=name
         self.elev=0.0
@@ -106,12 +113,12 @@ class Env:
         self.safe2_yw=10
         self.safe2_area=aux.square(self.safe2_center, self.safe2_xw, self.safe2_yw)
         self.nominal={'elev':1.0, 'x':1.0, 'y':1.0}
-    def status(self):
-        status={'elev':self.elev, 'x':self.x, 'y':self.y}
-        return status.copy()
 
-class Direc:
+class Direc(fp.Flow):
+    __slots__=('flowtype', 'name', 'traj', 'power', 'nominal')
+    statevars=('traj', 'power')
     def __init__(self,name):
+        super().__init__()
         self.flowtype='Dir'
         self.name=name
         self.traj=[0,0,0]
@@ -579,6 +586,37 @@ class trajectory:
             self.behavior(time)
             self.lasttime=time
         self.condfaults()
+    #vectorized form of updatefxn for scenarios run in a batch (see fp.propbatch)
+    # the behavior only changes the scenarios where it has not yet been run at the time
+    def batchupdatefxn(self, time=0):
+        run=time>self.lasttime
+        if run.any():
+            self.batchbehavior(time, run)
+            self.lasttime=np.where(run, time, self.lasttime)
+    def batchbehavior(self, time, run):
+        maxpvel=5.0
+        
+        landed=self.Env.elev<=0.0
+        forcelg=np.where(landed, np.fmin(-2.0, (self.DOF.vertvel-self.DOF.planvel)/3), 0.0)
+        self.Force_LG.value=np.where(run, forcelg, self.Force_LG.value)
+        flight=np.where(landed, 0.0, 1.0)
+        
+        vertvel=self.DOF.vertvel
+        accel=run & (time>self.t1)
+        sign=np.sign(vertvel)
+        damp=-0.02*sign*np.power(vertvel, 2)-0.1*vertvel
+        acc=10*(self.DOF.uppwr-flight)
+        newvel=vertvel+acc+damp
+        newvel=np.where(landed, np.fmax(0, newvel), newvel)
+        self.DOF.vertvel=np.where(accel, newvel, vertvel)
+        self.t1=np.where(accel, time, self.t1)
+        
+        self.DOF.planvel=np.where(run, flight*maxpvel*self.DOF.planpwr, self.DOF.planvel)
+        
+        traj=self.Dir.traj
+        self.Env.elev=np.where(run, np.fmax(0.0, self.Env.elev+self.DOF.vertvel), self.Env.elev)
+        self.Env.x=np.where(run, self.Env.x+self.DOF.planvel*traj[:,0], self.Env.x)
+        self.Env.y=np.where(run, self.Env.y+self.DOF.planvel*traj[:,1], self.Env.y)
 
 ##future: try to automate this part so you don't have to do it in a wierd order
 def initialize():
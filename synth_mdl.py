@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+File name: synth_mdl.py
+Description: Synthetic fault models of a given size, for benchmarking the propagation code
+
+The models are a chain of functions passing signals along from a source to a sink:
+    - the source function gives a signal following an operational profile (idle, on, then idle)
+    - each following function passes the largest signal it receives on to the next function
+    - some functions also pass their signal back to an earlier function, making feedback loops
+
+The faults of each function are taken in turn from:
+    - loss, where it no longer passes the signal on
+    - amplify, where it doubles the signal (up to a limit)
+    - attenuate, where it halves the signal
+    - stuck, where it passes on a fixed signal
+(with a number added to the name when there are more modes than these, e.g. loss2)
+
+Models are made with makemodel, which gives an object that is used like a model module,
+e.g. in proplist. Models are rebuilt from their spec in worker processes (see faultprop.initworker).
+"""
+
+import types
+
+import networkx as nx
+import numpy as np
+
+import faultprop as fp
+
+#the effects of the faults on the signal passed on by a function, and their rates and costs
+#(effects are also applied to arrays of signals, see synthFxn.batchupdatefxn)
+faultkinds={'loss':{'rate':'moderate', 'rcost':'major', 'effect':lambda value: 0.0}, \
+            'amplify':{'rate':'rare', 'rcost':'minor', 'effect':lambda value: np.minimum(2.0*value, 10.0)}, \
+            'attenuate':{'rate':'moderate', 'rcost':'minor', 'effect':lambda value: 0.5*value}, \
+            'stuck':{'rate':'rare', 'rcost':'major', 'effect':lambda value: 1.0}}
+
+##DEFINE MODEL FLOWS
+class Signal(fp.Flow):
+    __slots__=('value',)
+    statevars=('value',)
+    def __init__(self):
+        super().__init__()
+        self.value=0.0
+
+##DEFINE MODEL FUNCTIONS
+# every function in the model is of the same class, with the source function having no input flows
+class synthFxn:
+    def __init__(self, inflows, outflows, modes, ontime, offtime):
+        self.inflows=inflows
+        self.outflows=outflows
+        self.ontime=ontime
+        self.offtime=offtime
+        #modes gives the kind of each mode (see faultkinds)
+        self.modes=modes
+        self.faultmodes={mode:{'rate':faultkinds[kind]['rate'], 'rcost':faultkinds[kind]['rcost']} for mode, kind in modes.items()}
+        self.faults=set(['nom'])
+    def behavior(self, time):
+        if self.inflows:
+            value=max([flow.value for flow in self.inflows])
+        elif self.ontime<=time<self.offtime:
+            value=1.0
+        else:
+            value=0.5
+        for mode, kind in self.modes.items():
+            if mode in self.faults:
+                value=faultkinds[kind]['effect'](value)
+        for flow in self.outflows:
+            flow.value=value
+    def updatefxn(self,faults=['nom'], time=0):
+        self.faults.update(faults)
+        self.behavior(time)
+        return
+    #vectorized form of updatefxn for scenarios run in a batch (see fp.propbatch), where the 
+    # signals are arrays with a value for each scenario
+    def batchupdatefxn(self, time=0):
+        fxn=self.fxns[0]
+        if fxn.inflows:
+            value=np.max([flow.value for flow in self.inflows], axis=0)
+        elif fxn.ontime<=time<fxn.offtime:
+            value=np.full(len(self.fxns), 1.0)
+        else:
+            value=np.full(len(self.fxns), 0.5)
+        for mode, kind in fxn.modes.items():
+            value=np.where(self.hasfault(mode), faultkinds[kind]['effect'](value), value)
+        #(empty lists of flows, e.g. of the sink, are not lists of BatchFlows)
+        if fxn.outflows:
+            for flow in self.outflows:
+                flow.value=value
+
+#INSTANTIATE MODEL
+# initializes a synthetic model graph
+# inputs:
+#   - numfxns, the number of functions in the chain
+#   - flowsperedge, the number of flows on each edge between functions
+#   - modesperfxn, the number of fault modes of each function
+#   - loopdensity, the fraction of functions which pass their signal back to an earlier function
+#   - horizon, the last time of the model
+#   - seed, the seed of the random choice of which functions make feedback loops (and to where)
+# outputs: g, the model graph
+def initialize(numfxns=10, flowsperedge=1, modesperfxn=2, loopdensity=0.0, horizon=55, seed=0):
+    kinds=list(faultkinds)
+    modes={}
+    for i in range(modesperfxn):
+        kind=kinds[i%len(kinds)]
+        modes[kind+(str(i//len(kinds)+1) if i>=len(kinds) else '')]=kind
+    edges=[(i, i+1) for i in range(numfxns-1)]
+    random=np.random.RandomState(seed)
+    for i in range(1, numfxns):
+        if random.random_sample()<loopdensity:
+            edges.append((i, random.randint(0, i)))
+    edgeflows={edge:[Signal() for k in range(flowsperedge)] for edge in edges}
+    inflows={i:[] for i in range(numfxns)}
+    outflows={i:[] for i in range(numfxns)}
+    for (big, end), flows in edgeflows.items():
+        outflows[big].extend(flows)
+        inflows[end].extend(flows)
+    g=nx.DiGraph()
+    for i in range(numfxns):
+        g.add_node('F'+str(i), obj=synthFxn(inflows[i], outflows[i], modes, 5, int(0.9*horizon)))
+    for (big, end), flows in edgeflows.items():
+        g.add_edge('F'+str(big), 'F'+str(end), **{'S'+str(big)+'_'+str(end)+'_'+str(k):flow for k, flow in enumerate(flows)})
+    return g
+
+#PROVIDE MEANS OF CLASSIFYING RESULTS
+def findclassification(resgraph, endfaults, endflows, scen):
+    repcosts=fp.listfaultsprops(endfaults, resgraph, 'rcost')
+    costkey={'major': 10000, 'minor': 1000}
+    totcost=sum([costkey[cost] for cost in repcosts.values()])
+    ratekey={'rare': 1e-7, 'moderate': 1e-5}
+    if scen['properties']['type']=='nominal':
+        rate=1.0
+    elif scen['properties']['type']=='multi-fault':
+        rate=np.prod([ratekey[qualrate] for qualrate in scen['properties']['rate']])
+    else:
+        rate=ratekey[scen['properties']['rate']]
+    life=1e5
+    expcost=rate*life*totcost
+    return {'rate':rate, 'cost': totcost, 'expected cost': expcost}
+
+#makemodel
+# makes a synthetic model, which can be used like a model module (e.g. in proplist). The
+# model keeps the arguments it was made with in spec and the name of this module in
+# generator, so it can be made again (e.g. in a worker process) with makemodel(**spec)
+# inputs: numfxns, flowsperedge, modesperfxn, loopdensity, horizon, seed, see initialize
+# outputs: mdl, the model
+def makemodel(numfxns=10, flowsperedge=1, modesperfxn=2, loopdensity=0.0, horizon=55, seed=0):
+    spec={'numfxns':numfxns, 'flowsperedge':flowsperedge, 'modesperfxn':modesperfxn, \
+          'loopdensity':loopdensity, 'horizon':horizon, 'seed':seed}
+    mdl=types.ModuleType('synth_mdl('+', '.join([key+'='+str(value) for key, value in spec.items()])+')')
+    mdl.generator=__name__
+    mdl.spec=spec
+    mdl.times=sorted(set([0, min(3, horizon), horizon]))
+    mdl.statevector=True
+    mdl.initialize=lambda: initialize(**spec)
+    mdl.findclassification=findclassification
+    return mdl
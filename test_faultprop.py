@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+File name: test_faultprop.py
+Description: tests of fault propagation in faultprop.py, using small models defined here
+(run with pytest)
+"""
+
+import types
+
+import networkx as nx
+import numpy as np
+
+import faultprop as fp
+import synth_mdl
+
+##TEST MODELS
+
+class Signal(fp.Flow):
+    __slots__=('value',)
+    statevars=('value',)
+    def __init__(self):
+        super().__init__()
+        self.value=1.0
+
+# a source which passes on a signal of 1.0
+class source:
+    def __init__(self, out):
+        self.out=out
+        self.faultmodes={}
+        self.faults=set(['nom'])
+    def updatefxn(self, faults=['nom'], time=0):
+        self.faults.update(faults)
+        self.out.value=1.0
+
+# a valve which passes its input on, except when worn out, which only has an effect from t=40
+class valve:
+    def __init__(self, inflow, out):
+        self.inflow=inflow
+        self.out=out
+        self.faultmodes={'wearout':{'rate':'moderate', 'rcost':'major'}}
+        self.faults=set(['nom'])
+    def updatefxn(self, faults=['nom'], time=0):
+        self.faults.update(faults)
+        if 'wearout' in self.faults and time>=40:
+            self.out.value=0.0
+        else:
+            self.out.value=self.inflow.value
+    def batchupdatefxn(self, time=0):
+        self.out.value=np.where(self.hasfault('wearout') & (time>=40), 0.0, self.inflow.value)
+
+# a sink with no behavior
+class sink:
+    def __init__(self, inflow):
+        self.inflow=inflow
+        self.faultmodes={}
+        self.faults=set(['nom'])
+    def updatefxn(self, faults=['nom'], time=0):
+        self.faults.update(faults)
+
+def initvalve():
+    In=Signal()
+    S=Signal()
+    g=nx.DiGraph()
+    g.add_node('Source', obj=source(In))
+    g.add_node('Valve', obj=valve(In, S))
+    g.add_node('Sink', obj=sink(S))
+    g.add_edge('Source', 'Valve', In=In)
+    g.add_edge('Valve', 'Sink', S=S)
+    return g
+
+# a function which passes on its input less 1.0 (down to -5.0), which in a loop with a valve
+# relaxes the signal from 1.0 down to -5.0, one pass per step
+class relax:
+    def __init__(self, inflow, out):
+        self.inflow=inflow
+        self.out=out
+        self.faultmodes={'drop':{'rate':'moderate', 'rcost':'major'}}
+        self.faults=set(['nom'])
+    def updatefxn(self, faults=['nom'], time=0):
+        self.faults.update(faults)
+        self.out.value=max(self.inflow.value-1.0, -5.0)
+    def batchupdatefxn(self, time=0):
+        self.out.value=np.maximum(self.inflow.value-1.0, -5.0)
+
+def initrelax():
+    X=Signal()
+    Y=Signal()
+    g=nx.DiGraph()
+    g.add_node('Relax', obj=relax(X, Y))
+    g.add_node('Valve', obj=valve(Y, X))
+    g.add_edge('Relax', 'Valve', Y=Y)
+    g.add_edge('Valve', 'Relax', X=X)
+    return g
+
+def classify(resgraph, endfaults, endflows, scen):
+    return {'rate':1e-5, 'cost':10000.0*len(endflows), 'expected cost':0.1*len(endflows)}
+
+# (the valve model is given to worker processes as made by this module, see fp.getworkerargs)
+def makevalvemdl():
+    mdl=types.ModuleType('valve_mdl')
+    mdl.times=[0, 3, 55]
+    mdl.initialize=initvalve
+    mdl.findclassification=classify
+    mdl.generator=__name__
+    mdl.spec={}
+    return mdl
+
+makemodel=makevalvemdl
+
+def makerelaxmdl():
+    mdl=types.ModuleType('relax_mdl')
+    mdl.times=[0, 1]
+    mdl.initialize=initrelax
+    mdl.findclassification=classify
+    return mdl
+
+##TESTS
+
+# a fault which only has an effect late in the run must not be cut off by stopping early
+def test_stopearly_timedependent_fault():
+    mdl=makevalvemdl()
+    scen=fp.listinitfaults(fp.initgraph(mdl), [3])[0]
+    for stopearly in [True, False]:
+        endresults, resgraph, flowhist, graphhist=fp.runonefault(mdl, scen, track=['S'], stopearly=stopearly)
+        assert endresults['flows']=={'S':{'value':0.0}}
+        assert flowhist['faulty']['S']['value'][39]==1.0
+        assert flowhist['faulty']['S']['value'][45]==0.0
+    resultsdict, resultstab=fp.proplist(mdl, times=[3])
+    assert resultsdict['Valve', 'wearout', 3]['flows']=={'S':{'value':0.0}}
+    assert resultsdict==fp.proplist(mdl, times=[3], stopearly=False)[0]
+
+# states with the same hash (e.g. -1.0 and -2.0) must not be taken for a repeated state (oscillation)
+def test_propagate_hash_collision():
+    assert hash(-1.0)==hash(-2.0)
+    g=initrelax()
+    profile=fp.PropProfile()
+    g.graph['profile']=profile
+    assert fp.propagate(g, {}, 0) is None
+    assert fp.getflow('X', g).value==-5.0
+    assert profile.steps[0][1]>len(g.nodes)
+    mdl=makerelaxmdl()
+    scenlist=fp.listinitfaults(fp.initgraph(mdl), [0])
+    for endresults in fp.propbatch(mdl, scenlist):
+        assert endresults['warnings']==[]
+        assert endresults['flows']=={}
+
+# histories of scenarios not yet written are NaN, and a store which cannot be resumed raises
+def test_histstore(tmp_path):
+    mdl=makevalvemdl()
+    scenlist=fp.listinitfaults(fp.initgraph(mdl), [3])
+    faultyhists, written=fp.createhiststore(str(tmp_path/'hists'), mdl, scenlist)
+    del faultyhists, written
+    hists=fp.loadhists(str(tmp_path/'hists'))
+    assert np.isnan(fp.getflowhist(hists, 0)['faulty']['S']['value']).all()
+    fp.proplist(mdl, times=[3], histpath=str(tmp_path/'hists'))
+    hists=fp.loadhists(str(tmp_path/'hists'))
+    assert hists['written'].all()
+    assert fp.getflowhist(hists, ('Valve', 'wearout', 3))['faulty']['S']['value'][45]==0.0
+    try:
+        fp.createhiststore(str(tmp_path/'missing'), mdl, scenlist, resume=True)
+        assert False
+    except ValueError:
+        pass
+    try:
+        fp.createhiststore(str(tmp_path/'hists'), mdl, scenlist[:0], resume=True)
+        assert False
+    except ValueError:
+        pass
+
+# a change passed down a chain of functions (with no feedback loops) settles in a single pass
+def test_propagate_chain_onepass():
+    mdl=synth_mdl.makemodel(10)
+    g=fp.initgraph(mdl)
+    nomscen=fp.constructnomscen(g)
+    profile=fp.PropProfile()
+    g.graph['profile']=profile
+    for rtime in range(0, 8):
+        fp.propagate(g, nomscen['faults'], rtime)
+    assert fp.getflow('S8_9_0', g).value==1.0
+    assert all([passes==1 for runs, passes, maxpasses in profile.steps.values()])
+
+# scenarios run together in a batch give the same results as scenarios run one at a time
+def test_propbatch_equivalence():
+    mdl=makevalvemdl()
+    times=list(range(0, 56, 5))
+    for stopearly in [True, False]:
+        resultsdict, resultstab=fp.proplist(mdl, times=times, stopearly=stopearly)
+        assert resultsdict==fp.proplist(mdl, times=times, batch=True, stopearly=stopearly)[0]
+    assert resultsdict['Valve', 'wearout', 0]['flows']=={'S':{'value':0.0}}
+
+# running one scenario of each class of equivalent scenarios gives the same results as running them all
+def test_dedup_equivalence():
+    mdl=makevalvemdl()
+    times=list(range(0, 56, 5))
+    resultsdict, resultstab=fp.proplist(mdl, times=times)
+    assert resultsdict==fp.proplist(mdl, times=times, dedup=True)[0]
+    assert resultsdict==fp.proplist(mdl, times=times, dedup=True, batch=True)[0]
+
+# scenarios run in worker processes (one at a time or in batches) give the same results as in this process
+def test_workers_equivalence():
+    mdl=makevalvemdl()
+    times=list(range(0, 56, 5))
+    resultsdict, resultstab=fp.proplist(mdl, times=times)
+    assert resultsdict==fp.proplist(mdl, times=times, workers=2)[0]
+    assert resultsdict==fp.proplist(mdl, times=times, workers=2, batch=True)[0]
+
+# a sweep stopped part-way (with the last entry of its journal cut off) resumes from its journal
+def test_journal_resume(tmp_path):
+    mdl=makevalvemdl()
+    times=list(range(0, 56, 5))
+    journal=str(tmp_path/'sweep.journal')
+    resultsdict, resultstab=fp.proplist(mdl, times=times)
+    sweep=fp.iterproplist(mdl, times=times, journal=journal)
+    for i in range(4):
+        next(sweep)
+    sweep.close()
+    with open(journal, 'rb+') as file:
+        file.truncate(file.seek(0, 2)-5)
+    done, journalfile=fp.openjournal(journal, mdl, [key for key in resultsdict])
+    journalfile.close()
+    assert len(done)==3
+    assert fp.proplist(mdl, times=times, journal=journal)[0]==resultsdict
+    done, journalfile=fp.openjournal(journal, mdl, [key for key in resultsdict])
+    journalfile.close()
+    assert done==resultsdict